@@ -1,62 +1,147 @@
-import meshtastic
-import meshtastic.serial_interface
-import meshtastic.tcp_interface
-import yaml
-import time
 import argparse
+import atexit
 import logging
+import queue
+import signal
+import threading
+import time
+from functools import partial
+from logging.handlers import QueueHandler, QueueListener
 from pubsub import pub
-from datetime import datetime, time as dt_time
 from modules.eccc_weather_service import ECCCWeatherService
-from modules.meshtastic_formatter import MeshtasticFormatter
+from modules.meshtastic_formatter import MeshtasticFormatter, RenderCache
+from modules.packet_packer import PacketPacker
+from modules.command_queue import CommandQueue, RecentPackets, TokenBucketLimiter
+from modules.metrics import metrics
+from modules.notifications import make_notification_source
+from modules.reply_fanout import ReplyFanout
+from modules.scheduler import Scheduler, next_daily
+from modules.settings_loader import (
+    RESTART_SETTINGS, SettingsError, SettingsFile, changed_settings, load_settings, validate_settings,
+)
+from modules.transmit_scheduler import TransmitScheduler, PRIORITY_ALERT, PRIORITY_BACKGROUND, PRIORITY_REPLY
 
 # --- Configuration ---
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Settings that change when periodic jobs run; a reload that changes any of them reschedules.
+SCHEDULE_SETTINGS = {
+    'ALERT_CHECK_INTERVAL', 'NOTIFY_FALLBACK_INTERVAL', 'BACKGROUND_REFRESH', 'FORECAST_REFRESH_OFFSET',
+    'REFRESH_JITTER', 'ENABLE_AUTO_REBOOT', 'AUTO_REBOOT_HOUR', 'AUTO_REBOOT_MINUTE', 'SNAPSHOT_INTERVAL',
+    'STATS_INTERVAL', 'METRICS_FILE', 'METRICS_INTERVAL', 'SETTINGS_RELOAD_INTERVAL',
+}
+
+def configure_logging(level=logging.INFO):
+    """
+    Logs through a queue: radio, worker and transmit threads only enqueue the
+    record, and a listener thread does the (possibly slow) console I/O.
+    The listener is flushed and stopped at interpreter exit.
+    """
+    log_queue = queue.SimpleQueue()
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    listener = QueueListener(log_queue, handler)
+    logging.basicConfig(level=level, handlers=[QueueHandler(log_queue)])
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
 
 # --- Main Application Logic ---
 
 class AkitaBot:
     """
     The main class for the Akita WeatherBot.
-    Orchestrates the Meshtastic interface, weather data fetching, and message handling.
+    Orchestrates the Meshtastic interfaces, weather data fetching, and message handling.
+    One bot can drive several radios; each gets its own transmit queue, replies
+    go out on the radio the command arrived on, and alerts go out on all of them.
     """
-    def __init__(self, settings, port=None, host=None):
+    def __init__(self, settings, ports=None, hosts=None, settings_path=None):
         self.settings = settings
-        self.port = port
-        self.host = host
-        self.interface = None
+        # Watched for changes (and reloaded on SIGHUP) when the bot was started from a file
+        self.settings_file = SettingsFile(settings_path) if settings_path else None
+        self._reload_requested = False
+        self.allowed_nodes, self.admin_nodes = self._node_sets(settings)
+        self.ports = list(ports or [])
+        self.hosts = list(hosts or [])
+        self.interface = None  # The first (primary) radio
+        self.interfaces = []
+        self.transmitters = {}  # interface -> TransmitScheduler
+        self.node_nums = {}  # interface -> our node number on that radio
         self.bot_node_num = None
-        self.last_alert_check = 0
-        self.reboot_scheduled = not self.settings.get('ENABLE_AUTO_REBOOT', False) # True if disabled
+        self._started = False
+        self.scheduler = Scheduler()
 
         # Initialize services
-        self.weather_service = ECCCWeatherService(settings)
+        # Bots on other radios keep their own alert records and snapshot
+        self.weather_service = ECCCWeatherService(settings, instance=",".join(self.ports + self.hosts))
         self.formatter = MeshtasticFormatter(settings)
-        
+        self.packer = PacketPacker(settings)
+        self.render_cache = RenderCache()
+        self.weather_service.add_forecast_listener(self.on_forecast_updated)
+        self.weather_service.add_alert_listener(self.on_alerts_changed)
+
+        # Inbound command handling: dedupe, per-sender rate limit, bounded queue + workers
+        self.recent_packets = RecentPackets()
+        self.rate_limiter = TokenBucketLimiter(rate=settings.get('RATE_LIMIT_PER_MINUTE', 6),
+                                               burst=settings.get('RATE_LIMIT_BURST', 3))
+        # Optional sharing of identical replies between nodes asking at about the same time
+        self.fanout = ReplyFanout(settings)
+        self.command_queue = CommandQueue(self.handle_command,
+                                          workers=settings.get('COMMAND_WORKERS', 2),
+                                          max_size=settings.get('INBOUND_QUEUE_SIZE', 32))
+
+        # Optional push announcements from the ECCC datamart; polling becomes the fallback
+        self.notifications = make_notification_source(settings)
+        self.push_enabled = False
+
+        self.known_commands = {"?", "test", "tst-detail", "alert-status", "alert", "advertise", "stats",
+                               *self.formatter.FORECAST_COMMANDS}
+        self.register_gauges()
+
         # Subscribe to Meshtastic events
         pub.subscribe(self.on_receive, "meshtastic.receive")
         pub.subscribe(self.on_connection, "meshtastic.connection.established")
 
     def connect(self):
-        """Establishes connection to the Meshtastic device."""
-        logging.info("Connecting to Meshtastic device...")
+        """Establishes connections to every configured Meshtastic device."""
+        logging.info("Connecting to Meshtastic device(s)...")
+        # Imported here so the (slow) meshtastic import happens after startup work
+        # such as restoring the snapshot, not before it.
+        import meshtastic.serial_interface
+        import meshtastic.tcp_interface
         try:
-            if self.port:
-                self.interface = meshtastic.serial_interface.SerialInterface(self.port)
-            elif self.host:
-                self.interface = meshtastic.tcp_interface.TCPInterface(self.host)
-            else:
-                self.interface = meshtastic.serial_interface.SerialInterface()
+            for port in self.ports:
+                self.add_interface(meshtastic.serial_interface.SerialInterface(port))
+            for host in self.hosts:
+                self.add_interface(meshtastic.tcp_interface.TCPInterface(host))
+            if not self.interfaces:
+                self.add_interface(meshtastic.serial_interface.SerialInterface())
         except Exception as e:
             logging.error(f"Could not connect to Meshtastic device: {e}")
             exit(1)
 
+    def add_interface(self, interface):
+        """Registers a connected radio and gives it its own transmit queue."""
+        if self.interface is None:
+            self.interface = interface
+        self.interfaces.append(interface)
+        transmitter = self.transmitters[interface] = TransmitScheduler(self.settings, partial(self._transmit, interface))
+        if self._started:
+            transmitter.start()
+        return transmitter
+
+    def transmitter_for(self, interface):
+        """The transmit queue for a radio, falling back to the primary one."""
+        return self.transmitters.get(interface) or self.transmitters[self.interface]
+
     def on_connection(self, interface, topic=None):
         """Callback fired when a connection to a radio is established."""
-        self.bot_node_num = interface.myInfo.my_node_num
-        self.bot_node_id = interface.myInfo.node_num_as_string
-        logging.info(f"Connection established to node! My node number is: {self.bot_node_num}")
-        logging.info(f"My node ID is: {self.bot_node_id}")
+        node_num = interface.myInfo.my_node_num
+        self.node_nums[interface] = node_num
+        if interface is self.interface or self.bot_node_num is None:
+            self.bot_node_num = node_num
+            self.bot_node_id = interface.myInfo.node_num_as_string
+        logging.info(f"Connection established to node! My node number is: {node_num}")
+        logging.info(f"My node ID is: {interface.myInfo.node_num_as_string}")
 
     def on_receive(self, packet, interface):
         """Callback fired when a packet is received."""
@@ -79,30 +164,65 @@ class AkitaBot:
             # Fallback: leave sender_node_id_str as None if structure is unexpected
             sender_node_id_str = None
 
-        if not message_text or sender_id == self.bot_node_num:
-            return # Ignore empty messages or messages from ourselves
+        if not message_text or sender_id == self.bot_node_num or sender_id in self.node_nums.values():
+            return # Ignore empty messages or messages from ourselves (on any of our radios)
 
         # Safely build a display string for logging (avoid formatting strings with :x)
         sender_display = sender_node_id_str if sender_node_id_str else format(sender_id, 'x') if isinstance(sender_id, int) else str(sender_id)
         logging.info(f"Received '{message_text}' from {sender_display}")
 
         # Enforce DM Mode if enabled
-        if self.settings.get('DM_MODE') and packet.get('to') != self.bot_node_num:
+        if self.settings.get('DM_MODE') and packet.get('to') != self.node_nums.get(interface, self.bot_node_num):
             logging.info("Ignoring message on public channel due to DM_MODE=true")
             return
 
         # Enforce Firewall if enabled
-        if self.settings.get('FIREWALL') and sender_node_id_str not in self.settings.get('MYNODES', []):
+        if self.settings.get('FIREWALL') and sender_node_id_str not in self.allowed_nodes:
             logging.warning(f"Ignoring message from non-whitelisted node {sender_node_id_str}")
             return
 
-        self.handle_command(message_text, packet, interface)
+        # Mesh retransmissions of a packet we already accepted
+        if self.recent_packets.check_and_add(sender_id, packet.get('id')):
+            logging.info(f"Ignoring duplicate packet {packet.get('id')} from {sender_display}")
+            return
+
+        if not self.rate_limiter.allow(sender_id):
+            logging.warning(f"Rate limit exceeded by {sender_display}; dropping '{message_text}'")
+            return
+
+        # Hand off to the command workers; never block the radio reader thread
+        if not self.command_queue.submit(message_text, packet, interface, sender_node_id_str):
+            logging.warning(f"Inbound queue full; shedding '{message_text}' from {sender_display}")
+            self.transmitter_for(interface).enqueue("Busy, please try again later.", destination=sender_id,
+                                                    priority=PRIORITY_BACKGROUND)
+
+    def resolve_site(self, location, sender_node_id=None):
+        """
+        Picks the forecast site for a command: an explicit location argument,
+        then the sender's default from NODE_LOCATIONS, then ECCC_LOCATION_CODE.
+        Returns None only if an explicit location is unknown.
+        """
+        if location:
+            return self.weather_service.resolve_location(location)
+        node_location = (self.settings.get('NODE_LOCATIONS') or {}).get(sender_node_id)
+        site = self.weather_service.resolve_location(node_location)
+        if site is None:
+            logging.warning(f"Unknown NODE_LOCATIONS entry '{node_location}' for {sender_node_id}; using default location.")
+            site = self.weather_service.default_site
+        return site
+
+    def handle_command(self, command, packet, interface, sender_node_id=None):
+        """Processes the received command and sends a reply, timing it per command."""
+        name = command.partition(" ")[0]
+        with metrics.span('command', name if name in self.known_commands else 'other'):
+            self._handle_command(command, packet, interface, sender_node_id)
 
-    def handle_command(self, command, packet, interface):
-        """Processes the received command and sends a reply."""
+    def _handle_command(self, command, packet, interface, sender_node_id=None):
         reply = ""
         destination_id = packet.get('from')
-        forecast = None
+        # Commands may carry a location, e.g. "2day kingston"
+        command, _, argument = command.partition(" ")
+        argument = argument.strip()
         try:
             if command == "?":
                 reply = self.formatter.format_help_menu()
@@ -113,33 +233,36 @@ class AkitaBot:
             elif command == "alert-status":
                 alerts = self.weather_service.get_alerts()
                 reply = f"Alert system OK. Found {len(alerts)} active alerts for {self.settings['ALERT_PROVINCE_CODE']}."
+            elif command == "alert":
+                alert = self.weather_service.find_alert(argument) if argument else None
+                if alert:
+                    self.send_shared(f"alert {argument}", ('alert', alert['id']),
+                                     self.render_alert_details(alert), destination_id, interface)
+                    return
+                reply = f"No active alert '{argument}'." if argument else "Usage: alert <id>"
+            elif command == "stats":
+                if packet.get('to') != self.node_nums.get(interface, self.bot_node_num) \
+                        or sender_node_id not in self.admin_nodes:
+                    reply = "Command 'stats' is for admins only (by DM)."
+                else:
+                    reply = self.formatter.format_stats(metrics)
             elif command == "advertise":
                 logging.info(f"Broadcasting menu from {self.bot_node_id}")
-                interface.sendText(self.formatter.format_help_menu())
+                self.transmitter_for(interface).enqueue(self.packer.pack(self.formatter.format_help_menu()))
                 return # No direct reply needed
-            elif command in ["hourly", "5day", "7day", "4day", "2day", "rain", "temp"]:
-                # Fetch data only if needed for the command group
-                is_hourly_cmd = command in ["hourly", "rain", "temp"]
-                forecast = self.weather_service.get_forecast(hourly=is_hourly_cmd)
-                
-                if not forecast:
-                    reply = "Weather data is currently unavailable."
-                elif command == "hourly" and self.settings.get('ENABLE_HOURLY_WEATHER'):
-                    reply = self.formatter.format_hourly(forecast)
-                elif command == "5day" and self.settings.get('ENABLE_5DAY_FORECAST'):
-                    reply = self.formatter.format_daily_forecast(forecast, days=5, details=True)
-                elif command == "7day" and self.settings.get('ENABLE_7DAY_FORECAST'):
-                    reply = self.formatter.format_daily_forecast(forecast, days=7)
-                elif command == "4day":
-                    reply = self.formatter.format_daily_forecast(forecast, days=4)
-                elif command == "2day":
-                    reply = self.formatter.format_daily_forecast(forecast, days=2, details=True)
-                elif command == "rain":
-                    reply = self.formatter.format_rain(forecast)
-                elif command == "temp":
-                    reply = self.formatter.format_temp(forecast)
-                else:
+            elif command in self.formatter.FORECAST_COMMANDS:
+                site = self.resolve_site(argument, sender_node_id)
+                if not self.formatter.is_enabled(command):
                     reply = f"Command '{command}' is disabled in settings."
+                elif not site:
+                    reply = f"Unknown location '{argument}'."
+                else:
+                    messages = self.render_forecast(command, site)
+                    if messages:
+                        self.send_shared(f"{command} {argument}".strip(), ('forecast', command, site.code),
+                                         messages, destination_id, interface)
+                        return
+                    reply = "Weather data is currently unavailable."
             else:
                 reply = f"Unknown command '{command}'. Send '?' for a list of commands."
 
@@ -147,98 +270,334 @@ class AkitaBot:
             logging.error(f"Error handling command '{command}': {e}", exc_info=True)
             reply = "An error occurred. Please try again later."
         
-        self.send_reply(reply, destination_id)
+        self.send_reply(reply, destination_id, interface)
+
+    def render_forecast(self, command, site):
+        """
+        Returns the packed reply messages for a forecast command, or None if no
+        data is available. Replies are memoized per forecast version, so repeat
+        requests are a dictionary lookup.
+        """
+        forecast = self.weather_service.get_forecast_entry(site)
+        if not forecast:
+            return None
+        return self.render_cache.get_or_render(
+            command, site.code, forecast.version, self.formatter.settings_hash,
+            lambda: self.packer.pack(self.formatter.format_forecast_command(command, forecast)))
+
+    def render_alert_details(self, alert):
+        """Returns the packed 'alert <id>' reply, memoized per alert version."""
+        return self.render_cache.get_or_render(
+            'alert', alert['id'], (alert['sent'], alert['msg_type']), self.formatter.settings_hash,
+            lambda: self.packer.pack(self.formatter.format_alert_details(alert)))
+
+    def on_forecast_updated(self, site, forecast):
+        """Drops stale rendered replies for a site and optionally pre-renders fresh ones."""
+        self.render_cache.invalidate(site.code)
+        if not self.settings.get('PRERENDER_REPLIES', True):
+            return
+        for command in self.formatter.FORECAST_COMMANDS:
+            if self.formatter.is_enabled(command):
+                self.render_cache.get_or_render(
+                    command, site.code, forecast.version, self.formatter.settings_hash,
+                    lambda: self.packer.pack(self.formatter.format_forecast_command(command, forecast)))
 
-    def send_reply(self, text, destination_id):
-        """Sends a reply, splitting it into multiple messages if necessary."""
+    def send_reply(self, text, destination_id, interface=None):
+        """Queues a reply, splitting it into multiple messages if necessary."""
         if not text:
             return
         
-        MAX_LEN = 200 # A safe character limit for Meshtastic packets
-        messages = [text[i:i+MAX_LEN] for i in range(0, len(text), MAX_LEN)]
-        
-        for i, msg in enumerate(messages):
-            # Build a safe display string for the destination id for logging
-            dest_display = format(destination_id, 'x') if isinstance(destination_id, int) else str(destination_id)
-            logging.info(f"Sending reply to {dest_display}: {msg}")
-            self.interface.sendText(msg, destinationId=destination_id)
-            if i < len(messages) - 1:
-                time.sleep(self.settings.get('MESSAGE_DELAY', 5))
+        with metrics.span('send_reply'):
+            self.send_messages(self.packer.pack(text), destination_id, interface)
 
-    def check_for_alerts(self):
-        """Periodically checks for new weather alerts and broadcasts them."""
-        interval = self.settings.get('ALERT_CHECK_INTERVAL', 300)
-        if time.time() - self.last_alert_check < interval:
+    def send_messages(self, messages, destination_id, interface=None):
+        """Queues already-packed reply messages on the radio the command came in on."""
+        self.transmitter_for(interface).enqueue(messages, destination=destination_id, priority=PRIORITY_REPLY)
+
+    def send_shared(self, label, key, messages, destination_id, interface=None):
+        """
+        Queues a rendered reply that other nodes may also ask for. With
+        REPLY_FANOUT on, identical requests (same key) share one transmission
+        where possible; otherwise this is send_messages().
+        """
+        if not self.fanout.enabled:
+            self.send_messages(messages, destination_id, interface)
             return
+        self.fanout.send(self.transmitter_for(interface), key, messages, destination_id,
+                         partial(self.formatter.format_fanout_pointer, label))
 
+    def broadcast(self, messages, priority=PRIORITY_ALERT):
+        """Queues packed messages for broadcast on every radio."""
+        for transmitter in self.transmitters.values():
+            transmitter.enqueue(messages, priority=priority)
+
+    def _transmit(self, interface, text, destination_id):
+        """Sends a single packet. Called from that radio's transmit scheduler thread."""
+        # Per-packet logging is DEBUG and lazily formatted; it runs for every packet.
+        if destination_id is None:
+            logging.debug("Broadcasting: %s", text)
+            interface.sendText(text)
+        else:
+            logging.debug("Sending reply to %s: %s", destination_id, text)
+            interface.sendText(text, destinationId=destination_id)
+
+    def check_for_alerts(self):
+        """Checks for new weather alerts and queues them for broadcast. Runs on the scheduler."""
         logging.info("Checking for new weather alerts...")
-        self.last_alert_check = time.time()
         try:
             new_alerts = self.weather_service.get_new_alerts() 
-            if new_alerts:
-                logging.info(f"Found {len(new_alerts)} new alerts. Broadcasting...")
+            if not new_alerts:
+                return
+            logging.info(f"Found {len(new_alerts)} new alerts. Broadcasting...")
+            if self.settings.get('ALERT_COMPACT', True):
+                # One grouped broadcast; details are rendered now and sent on request
+                self.broadcast(self.packer.pack(self.formatter.format_alert_batch(new_alerts)), priority=PRIORITY_ALERT)
                 for alert in new_alerts:
-                    formatted_alert = self.formatter.format_alert(alert)
-                    # Broadcast to the primary channel
-                    self.interface.sendText(formatted_alert)
-                    time.sleep(self.settings.get('MESSAGE_DELAY', 15))
+                    self.render_alert_details(alert)
+                return
+            for alert in new_alerts:
+                formatted_alert = self.formatter.format_alert(alert)
+                # Broadcast on every radio's primary channel, ahead of any queued replies
+                self.broadcast(self.packer.pack(formatted_alert), priority=PRIORITY_ALERT)
         except Exception as e:
             logging.error(f"Failed to check for or broadcast alerts: {e}")
 
-    def check_for_reboot(self):
-        """Periodically checks if a scheduled reboot is due."""
-        if not self.settings.get('ENABLE_AUTO_REBOOT', False):
-            return
+    def reboot_node(self):
+        """Reboots the radio. Runs daily on the scheduler when ENABLE_AUTO_REBOOT is set."""
+        delay = self.settings.get('REBOOT_DELAY_SECONDS', 10)
+        logging.info(f"Scheduled reboot time reached. Rebooting node(s) in {delay} seconds.")
+        for interface in self.interfaces:
+            interface.reboot(delay)
 
-        now = datetime.now()
-        reboot_hour = self.settings.get('AUTO_REBOOT_HOUR', 3)
-        reboot_minute = self.settings.get('AUTO_REBOOT_MINUTE', 0)
-        reboot_time = dt_time(reboot_hour, reboot_minute)
+    def log_stats(self):
+        """Logs a one-line summary of queue, cache and download counters."""
+        queue_stats = self.command_queue.stats
+        http = self.weather_service.http_stats
+        logging.info(
+            f"Stats: inbound depth={self.command_queue.depth()} processed={queue_stats['processed']} "
+            f"shed={queue_stats['shed']} max_wait={queue_stats['max_wait']:.1f}s; "
+            f"outbound depth={sum(t.queue_depth() for t in self.transmitters.values())}; "
+            f"render cache hits={self.render_cache.hits} misses={self.render_cache.misses}; "
+            f"fanout shared={metrics.counters.get('fanout_shared', 0)} "
+            f"airtime saved={metrics.counters.get('fanout_airtime_saved_seconds', 0.0):.0f}s; "
+            f"http requests={http['requests']} 304s={http['not_modified']} "
+            f"downloaded={http['bytes_downloaded']}B saved={http['bytes_saved']}B"
+        )
 
-        # If it's the reboot time and we haven't already rebooted today
-        if now.time() >= reboot_time and not self.reboot_scheduled:
-            logging.info(f"Scheduled reboot time reached. Rebooting node in {self.settings.get('REBOOT_DELAY_SECONDS', 10)} seconds.")
-            self.interface.reboot(self.settings.get('REBOOT_DELAY_SECONDS', 10))
-            self.reboot_scheduled = True # Mark that we've scheduled it for today
-        
-        # Reset the flag after midnight
-        if now.time() < reboot_time and self.reboot_scheduled:
-            logging.info("Past the reboot time. Resetting daily reboot schedule flag.")
-            self.reboot_scheduled = False
+    def register_gauges(self):
+        """Exposes existing queue, cache and download counters through the metrics registry."""
+        http = self.weather_service.http_stats
+        for key in ('requests', 'not_modified', 'bytes_downloaded', 'bytes_saved'):
+            metrics.register_gauge(f"http_{key}", partial(http.get, key, 0))
+        for key in ('processed', 'shed', 'failed'):
+            metrics.register_gauge(f"commands_{key}", partial(self.command_queue.stats.get, key, 0))
+        metrics.register_gauge('inbound_queue_depth', self.command_queue.depth)
+        metrics.register_gauge('outbound_queue_depth',
+                               lambda: sum(t.queue_depth() for t in self.transmitters.values()))
+        metrics.register_gauge('render_cache_hit_ratio', lambda: self.render_cache.hits / max(
+            1, self.render_cache.hits + self.render_cache.misses))
+        metrics.register_gauge('forecast_cache_bytes', self.weather_service.forecast_cache.total_bytes)
+
+    def export_metrics(self):
+        """Writes the metrics file (Prometheus text format). Runs on the scheduler."""
+        try:
+            metrics.write_file(self.settings['METRICS_FILE'])
+        except OSError as e:
+            logging.error(f"Failed to write metrics file: {e}")
+            return False
+
+    def on_alerts_changed(self):
+        """
+        Called when an alert refresh finds changes. The background refresh and the
+        alert poll run on separate timers, so without this a new alert could wait
+        for the refresh and then again for the poll.
+        """
+        self.scheduler.run_soon('alert-poll')
+
+    def on_announcement(self, path):
+        """Called from the notification source when the datamart announces a changed file."""
+        if self.weather_service.on_announcement(path) == 'alerts':
+            # Check (and broadcast) new alerts now, or once the debounce allows, instead of at the next poll
+            self.scheduler.run_soon('alert-poll', delay=self.weather_service.next_alert_push - time.time())
+
+    def schedule_jobs(self, run_now=True):
+        """
+        Registers all periodic work on the scheduler. Called again with
+        run_now=False after a settings reload, replacing the jobs in place.
+        """
+        alert_interval = self.settings.get('ALERT_CHECK_INTERVAL', 300)
+        if self.push_enabled:
+            # Announcements trigger refreshes; polling only catches missed ones
+            alert_interval = max(alert_interval, self.settings.get('NOTIFY_FALLBACK_INTERVAL', 1800))
+        self.weather_service.alert_refresh_interval = alert_interval
+
+        if self.settings.get('BACKGROUND_REFRESH', True):
+            self.weather_service.schedule_refresh(self.scheduler, run_now=run_now)
+        else:
+            self.weather_service.unschedule_refresh(self.scheduler)
+            self.scheduler.add_job('cache-eviction', self.weather_service.evict_expired, interval=3600)
+
+        self.scheduler.add_job('alert-poll', self.check_for_alerts, interval=alert_interval, run_now=run_now)
+
+        if self.settings.get('ENABLE_AUTO_REBOOT', False):
+            # Never reboot hours late (e.g. after the host slept through the reboot time)
+            self.scheduler.add_job('auto-reboot', self.reboot_node,
+                                   next_run=next_daily(self.settings.get('AUTO_REBOOT_HOUR', 3),
+                                                       self.settings.get('AUTO_REBOOT_MINUTE', 0)),
+                                   catch_up=False, grace=900)
+        else:
+            self.scheduler.remove_job('auto-reboot')
+
+        if self.weather_service.snapshot_path:
+            self.scheduler.add_job('snapshot', self.weather_service.save_snapshot,
+                                   interval=self.settings.get('SNAPSHOT_INTERVAL', 900))
+
+        self.scheduler.add_job('stats-flush', self.log_stats, interval=self.settings.get('STATS_INTERVAL', 3600))
+
+        if self.settings.get('METRICS_FILE'):
+            self.scheduler.add_job('metrics-export', self.export_metrics,
+                                   interval=self.settings.get('METRICS_INTERVAL', 60), run_now=run_now)
+        else:
+            self.scheduler.remove_job('metrics-export')
+
+        if self.settings_file:
+            # With polling off, the job only runs when SIGHUP asks for a reload
+            self.scheduler.add_job('settings-watch', self.check_settings_file,
+                                   interval=self.settings.get('SETTINGS_RELOAD_INTERVAL', 10) or 3600)
+
+    # --- Settings hot reload ---
+
+    @staticmethod
+    def _node_sets(settings):
+        """The firewall whitelist and admin node IDs as sets, for O(1) checks per packet."""
+        return frozenset(settings.get('MYNODES') or ()), frozenset(settings.get('ADMIN_NODES') or ())
+
+    def request_reload(self, signum=None, frame=None):
+        """SIGHUP handler: reloads the settings file on the scheduler thread."""
+        self._reload_requested = True
+        # The signal may interrupt the scheduler while it holds its lock, so wake it from another thread
+        threading.Thread(target=self.scheduler.run_soon, args=('settings-watch',), daemon=True).start()
+
+    def request_stop(self, signum=None, frame=None):
+        """SIGTERM handler: stops the scheduler so run() returns and close() saves state."""
+        logging.info("Shutdown signal received.")
+        # As with SIGHUP, the scheduler lock may be held by the interrupted thread
+        threading.Thread(target=self.scheduler.stop, daemon=True).start()
+
+    def check_settings_file(self):
+        """Reloads the settings file if it was saved again (or a reload was requested). Runs on the scheduler."""
+        requested, self._reload_requested = self._reload_requested, False
+        changed = self.settings_file.changed()
+        if requested or (changed and self.settings.get('SETTINGS_RELOAD_INTERVAL', 10)):
+            self.reload_settings()
+
+    def reload_settings(self):
+        """Reads and applies the settings file, keeping the current settings if it is invalid."""
+        logging.info(f"Reloading settings from {self.settings_file.path}...")
+        try:
+            self.apply_settings(self.settings_file.read())
+        except SettingsError as e:
+            logging.error(f"Settings reload rejected, keeping the current settings: {e}")
+            return False
+
+    def apply_settings(self, settings):
+        """
+        Switches the running bot to new settings without dropping the radio link
+        or warm caches. The new settings are validated and everything that can
+        fail is built first, so an invalid file changes nothing. Rendered replies
+        are only dropped if a rendering setting changed, and alert relevance is
+        only reset if the alert area changed. Returns the set of changed keys.
+        """
+        validate_settings(settings)
+        changed = changed_settings(self.settings, settings)
+        if not changed:
+            logging.info("Settings unchanged.")
+            return changed
+        packer = PacketPacker(settings)
+        allowed_nodes, admin_nodes = self._node_sets(settings)
+
+        self.settings = settings
+        self.allowed_nodes, self.admin_nodes = allowed_nodes, admin_nodes
+        self.packer = packer
+        self.rate_limiter.configure(settings.get('RATE_LIMIT_PER_MINUTE', 6), settings.get('RATE_LIMIT_BURST', 3))
+        self.fanout.apply_settings(settings)
+        for transmitter in self.transmitters.values():
+            transmitter.apply_settings(settings)
+        rendering_changed = self.formatter.apply_settings(settings)
+        alert_area_changed = self.weather_service.apply_settings(settings)
+
+        if rendering_changed:
+            # Every cached reply was rendered with the old settings
+            self.render_cache.invalidate()
+            cache = self.weather_service.forecast_cache
+            for code in cache.locations():
+                entry = cache.get(code)
+                site = self.weather_service.resolve_location(code)
+                if entry and site:
+                    self.on_forecast_updated(site, entry)
+        if changed & SCHEDULE_SETTINGS:
+            self.schedule_jobs(run_now=False)
+        if alert_area_changed:
+            self.scheduler.run_soon('alert-poll')
+
+        restart = sorted(changed.intersection(RESTART_SETTINGS))
+        if restart:
+            logging.warning(f"Changes to {', '.join(restart)} take effect after a restart.")
+        logging.info(f"Settings reloaded ({', '.join(sorted(changed))} changed).")
+        return changed
 
     def run(self):
-        """The main loop of the bot."""
+        """Starts the workers and runs the scheduler until shutdown."""
+        signal.signal(signal.SIGTERM, self.request_stop)
+        # Serve warm caches from the last run straight away; the refresh jobs revalidate them
+        self.weather_service.load_snapshot()
         self.connect()
-        while True:
-            self.check_for_alerts()
-            self.check_for_reboot()
-            time.sleep(1) 
+        self._started = True
+        for transmitter in self.transmitters.values():
+            transmitter.start()
+        self.command_queue.start()
+        if self.settings.get('METRICS_PORT'):
+            metrics.serve(self.settings['METRICS_PORT'])
+        if self.notifications:
+            self.push_enabled = self.notifications.start(self.on_announcement)
+        if self.settings_file and hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, self.request_reload)
+        self.schedule_jobs()
+        # Sleeps until the next job is due instead of polling every second
+        self.scheduler.run()
 
     def close(self):
-        """Closes the connection to the Meshtastic device."""
-        if self.interface:
-            self.interface.close()
+        """Closes the connections to the Meshtastic devices."""
+        if self.notifications:
+            self.notifications.stop()
+        self.scheduler.stop()
+        self.command_queue.stop()
+        self.weather_service.save_snapshot()
+        self.weather_service.close()
+        for transmitter in self.transmitters.values():
+            transmitter.stop()
+        for interface in self.interfaces:
+            interface.close()
         logging.info("Connection closed. Shutting down.")
 
 
 if __name__ == "__main__":
+    configure_logging()
     parser = argparse.ArgumentParser(description="Akita WeatherBot for Meshtastic")
-    parser.add_argument("--port", help="The serial port for the Meshtastic device (e.g., /dev/ttyUSB0)")
-    parser.add_argument("--host", help="The hostname or IP of the Meshtastic device (e.g., meshtastic.local)")
+    parser.add_argument("--port", action="append",
+                        help="The serial port for a Meshtastic device (e.g., /dev/ttyUSB0). Repeat for several radios.")
+    parser.add_argument("--host", action="append",
+                        help="The hostname or IP of a Meshtastic device (e.g., meshtastic.local). Repeat for several radios.")
     parser.add_argument("--settings", default="settings_canada.yaml", help="Path to the settings file")
     args = parser.parse_args()
 
     try:
-        with open(args.settings, 'r') as f:
-            settings = yaml.safe_load(f)
-    except FileNotFoundError:
-        logging.error(f"FATAL: Settings file not found at '{args.settings}'")
-        exit(1)
-    except Exception as e:
-        logging.error(f"FATAL: Error loading settings file: {e}")
+        settings = load_settings(args.settings)
+    except SettingsError as e:
+        logging.error(f"FATAL: Invalid settings: {e}")
         exit(1)
 
-    bot = AkitaBot(settings, port=args.port, host=args.host)
+    bot = AkitaBot(settings, ports=args.port, hosts=args.host, settings_path=args.settings)
     try:
         bot.run()
     except KeyboardInterrupt:
@@ -0,0 +1,60 @@
+"""
+Stand-in for a meshtastic interface: records every sendText call with the
+on-air time it would have cost, and can inject received packets.
+"""
+import itertools
+import threading
+import time
+
+
+class _MyInfo:
+    def __init__(self, node_num):
+        self.my_node_num = node_num
+        self.node_num_as_string = f"!{node_num:08x}"
+
+
+class SentPacket:
+    __slots__ = ('at', 'destination', 'text', 'size', 'airtime')
+
+    def __init__(self, at, destination, text, size, airtime):
+        self.at = at
+        self.destination = destination
+        self.text = text
+        self.size = size
+        self.airtime = airtime
+
+
+class FakeRadio:
+    """
+    Records sendText calls instead of transmitting. Airtime is estimated with
+    the same per-byte and per-packet costs as the bot's transmit scheduler.
+    """
+
+    def __init__(self, node_num=0x0B07, ms_per_byte=8, overhead_ms=300):
+        self.myInfo = _MyInfo(node_num)
+        self.nodes = {}
+        self.ms_per_byte = ms_per_byte
+        self.overhead_ms = overhead_ms
+        self.sent = []
+        self._lock = threading.Lock()
+        self._packet_ids = itertools.count(1)
+
+    def add_node(self, node_num):
+        self.nodes[node_num] = {'num': node_num, 'user': {'id': f"!{node_num:08x}"}}
+
+    def packet(self, sender, text, to=None):
+        """Builds a received text packet in the shape meshtastic publishes."""
+        return {'from': sender, 'to': self.myInfo.my_node_num if to is None else to,
+                'id': next(self._packet_ids), 'decoded': {'text': text}, 'rssi': -90, 'snr': 6.5, 'hopLimit': 3}
+
+    def sendText(self, text, destinationId=None, **kwargs):
+        size = len(text.encode('utf-8'))
+        airtime = (self.overhead_ms + self.ms_per_byte * size) / 1000.0
+        with self._lock:
+            self.sent.append(SentPacket(time.perf_counter(), destinationId, text, size, airtime))
+
+    def reboot(self, secs=10):
+        pass
+
+    def close(self):
+        pass
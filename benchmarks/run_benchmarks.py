@@ -0,0 +1,354 @@
+"""
+Offline benchmarks for Akita WeatherBot.
+
+Runs the real AkitaBot and ECCCWeatherService against a local ECCC stand-in
+serving recorded fixtures, with a fake radio in place of the Meshtastic
+device, and reports parse throughput, fetch latency, command latency
+percentiles, packets per reply and memory. It also checks that concurrent
+callers of a cold cache share one download and one parse per URL, and exits
+with an error if they do not.
+
+    python benchmarks/run_benchmarks.py [--nodes 50] [--rounds 10] [--callers 20] [--reply-fanout broadcast] [--json report.json]
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import yaml  # noqa: E402
+
+from fake_radio import FakeRadio  # noqa: E402
+from fixtures import citypage, site_codes, storm_feed  # noqa: E402
+from stand_in import ECCCStandIn  # noqa: E402
+
+# Commands replayed by the load generator, with a mix similar to a busy mesh.
+COMMAND_MIX = ("2day", "2day", "4day", "rain", "temp", "hourly", "5day", "?", "alert-status",
+               "2day kingston", "rain kingston", "now", "trend", "test")
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a list of numbers (0 if empty)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+def bench_settings(workdir, **overrides):
+    """The shipped settings, made hermetic: no state files, no pacing, no rate limits."""
+    with open(os.path.join(REPO_DIR, 'settings_canada.yaml')) as f:
+        settings = yaml.safe_load(f)
+    settings.update({
+        'ECCC_LOCATION_CODE': 's0000458', 'ALERT_PROVINCE_CODE': 'ON',
+        'SITE_LIST_PATH': os.path.join(workdir, 'site_list_en.csv'),
+        'ALERT_STORE_PATH': None, 'SNAPSHOT_PATH': "", 'SHARED_CACHE_PATH': "",
+        'METRICS_FILE': "", 'METRICS_PORT': 0,
+        'MESSAGE_DELAY': 0, 'TX_DUTY_CYCLE_PERCENT': 0,
+        'RATE_LIMIT_PER_MINUTE': 0, 'BACKGROUND_REFRESH': False,
+        'FULL_MENU': True, 'ENABLE_5DAY_FORECAST': True, 'ENABLE_7DAY_FORECAST': True,
+        'ENABLE_HOURLY_WEATHER': True, 'DM_MODE': False, 'FIREWALL': False,
+        'INBOUND_QUEUE_SIZE': 4096,
+    })
+    settings.update(overrides)
+    return settings
+
+
+def make_service(stand_in, settings):
+    from modules.eccc_weather_service import ECCCWeatherService
+    service = ECCCWeatherService(settings)
+    stand_in.configure(service)
+    return service
+
+
+def bench_parse(service, iterations, storm):
+    """Citypage parses per second, and full vs incremental ingests of the storm feed."""
+    from lxml import etree
+    xml = citypage('s0000458')
+    start = time.perf_counter()
+    for _ in range(iterations):
+        root = etree.fromstring(xml)
+        service._parse_daily_forecast(root)
+        service._parse_hourly_forecast(root)
+        service._parse_current_conditions(root)
+    citypage_rate = iterations / (time.perf_counter() - start)
+
+    runs = max(1, iterations // 50)
+    full = []
+    for _ in range(runs):
+        service._alert_index = {}
+        start = time.perf_counter()
+        index, _ = service._ingest_alerts(storm)
+        full.append(time.perf_counter() - start)
+    service._alert_index = index
+    incremental = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        service._ingest_alerts(storm)
+        incremental.append(time.perf_counter() - start)
+
+    return {
+        'citypage_parses_per_sec': round(citypage_rate, 1),
+        'citypage_bytes': len(xml),
+        'storm_feed_bytes': len(storm),
+        'storm_feed_alerts': storm.count(b'<identifier>'),
+        'storm_full_ingest_ms': round(min(full) * 1000, 2),
+        'storm_incremental_ingest_ms': round(min(incremental) * 1000, 2),
+    }
+
+
+def bench_fetch(service, stand_in, codes):
+    """Cold (200) and revalidated (304) forecast refreshes for every fixture site."""
+    sites = [service.resolve_location(code) for code in codes]
+    results = {}
+    for phase in ('cold', 'revalidate'):
+        timings = []
+        for site in sites:
+            start = time.perf_counter()
+            service.refresh_forecast(site)
+            timings.append(time.perf_counter() - start)
+        results[f'{phase}_fetch_ms_p50'] = round(percentile(timings, 0.5) * 1000, 2)
+        results[f'{phase}_fetch_ms_p95'] = round(percentile(timings, 0.95) * 1000, 2)
+    results['http_requests'] = stand_in.requests
+    results['http_not_modified'] = stand_in.not_modified
+    return results
+
+
+def check_single_flight(stand_in, settings, callers):
+    """
+    Starts `callers` threads at once against a cold cache, each asking for the
+    default forecast and the alerts, and checks that they caused exactly one
+    download and one parse per URL. Raises AssertionError otherwise.
+    """
+    service = make_service(stand_in, settings)
+    site = service.resolve_location()
+    forecast_url, alert_url = service._forecast_url(site), service.ALERT_URL
+    counts = Counter()
+
+    def counted(name, fn, key):
+        def wrapper(*args, **kwargs):
+            counts[(name, key(*args))] += 1
+            return fn(*args, **kwargs)
+        return wrapper
+
+    # Counter updates are not atomic across threads, but extra calls would still show.
+    service._make_request = counted('fetch', service._make_request, lambda url, *_: url)
+    service._parse_daily_forecast = counted('parse', service._parse_daily_forecast, lambda root: forecast_url)
+    service._ingest_alerts = counted('parse', service._ingest_alerts, lambda data: alert_url)
+
+    barrier = threading.Barrier(callers)
+    errors = []
+
+    def caller():
+        try:
+            barrier.wait()
+            service.get_forecast_entry()
+            service.get_alerts()
+        except Exception as e:
+            errors.append(e)
+
+    # Latency keeps the first download in flight while the other callers arrive.
+    latency, stand_in.latency = stand_in.latency, max(stand_in.latency, 0.2)
+    try:
+        threads = [threading.Thread(target=caller) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        stand_in.latency = latency
+        service.close()
+
+    result = {'callers': callers}
+    for url, label in ((forecast_url, 'forecast'), (alert_url, 'alerts')):
+        result[f'{label}_fetches'] = counts[('fetch', url)]
+        result[f'{label}_parses'] = counts[('parse', url)]
+    if errors:
+        raise AssertionError(f"single-flight callers failed: {errors[0]!r}")
+    if any(value != 1 for key, value in result.items() if key != 'callers'):
+        raise AssertionError(f"expected one fetch and one parse per URL, got {result}")
+    return result
+
+
+def wait_idle(bot, expected, timeout=60):
+    """Waits until `expected` commands were handled and every outbound queue has drained."""
+    deadline = time.monotonic() + timeout
+    quiet = 0
+    while time.monotonic() < deadline:
+        stats = bot.command_queue.stats
+        done = stats['processed'] + stats['failed'] >= expected
+        drained = bot.command_queue.depth() == 0 and all(t.queue_depth() == 0 for t in bot.transmitters.values())
+        quiet = quiet + 1 if done and drained else 0
+        if quiet >= 3:
+            return True
+        time.sleep(0.005)
+    return False
+
+
+def bench_load(bot, radio, nodes, rounds, rng):
+    """
+    Replays rounds of DM bursts: every node sends one command at once, then
+    the round drains. Latency runs from on_receive to the reply's last packet
+    (replies shared through a channel broadcast are not timed).
+    """
+    from modules.metrics import metrics
+    latencies, packets, sizes = {}, {}, {}
+    submitted_total = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        first_sent = len(radio.sent)
+        submitted = {}
+        for node in nodes:
+            command = rng.choice(COMMAND_MIX)
+            submitted[node] = (command, time.perf_counter())
+            bot.on_receive(radio.packet(node, command), radio)
+        submitted_total += len(submitted)
+        if not wait_idle(bot, submitted_total):
+            logging.warning("Load round did not drain in time.")
+
+        by_destination = {}
+        for packet in radio.sent[first_sent:]:
+            by_destination.setdefault(packet.destination, []).append(packet)
+        for node, (command, sent_at) in submitted.items():
+            reply = by_destination.get(node)
+            if reply:
+                latencies.setdefault(command, []).append(reply[-1].at - sent_at)
+                packets.setdefault(command, []).append(len(reply))
+                sizes.setdefault(command, []).append(sum(p.size for p in reply))
+    elapsed = time.perf_counter() - start
+
+    everything = [value for values in latencies.values() for value in values]
+    report = {
+        'commands': submitted_total,
+        'commands_per_sec': round(submitted_total / elapsed, 1),
+        'latency_ms_p50': round(percentile(everything, 0.5) * 1000, 2),
+        'latency_ms_p95': round(percentile(everything, 0.95) * 1000, 2),
+        'latency_ms_p99': round(percentile(everything, 0.99) * 1000, 2),
+        'packets_sent': len(radio.sent),
+        'simulated_airtime_sec': round(sum(p.airtime for p in radio.sent), 1),
+        'fanout_airtime_saved_sec': round(metrics.counters.get('fanout_airtime_saved_seconds', 0.0), 1),
+        'per_command': {},
+    }
+    for command in sorted(latencies):
+        report['per_command'][command] = {
+            'count': len(latencies[command]),
+            'latency_ms_p50': round(percentile(latencies[command], 0.5) * 1000, 2),
+            'latency_ms_p95': round(percentile(latencies[command], 0.95) * 1000, 2),
+            'packets_per_reply': round(sum(packets[command]) / len(packets[command]), 2),
+            'bytes_per_reply': round(sum(sizes[command]) / len(sizes[command]), 1),
+        }
+    return report
+
+
+def bench_memory(stand_in, settings, codes, storm):
+    """Python heap used by a service holding every fixture site's forecast and the storm feed."""
+    tracemalloc.start()
+    service = make_service(stand_in, settings)
+    for code in codes:
+        service.refresh_forecast(service.resolve_location(code))
+    service._ingest_alerts(storm)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    report = {
+        'heap_kb_after_warmup': round(current / 1024, 1),
+        'heap_kb_peak': round(peak / 1024, 1),
+        'forecast_cache_bytes': service.forecast_cache.total_bytes(),
+    }
+    service.close()
+    try:
+        import resource
+        report['max_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    except ImportError:
+        pass  # Not available on Windows
+    return report
+
+
+def print_report(report):
+    for section, values in report.items():
+        print(f"\n== {section} ==")
+        for key, value in values.items():
+            if isinstance(value, dict):
+                print(f"  {key}:")
+                for command, stats in value.items():
+                    details = " ".join(f"{k}={v}" for k, v in stats.items())
+                    print(f"    {command:<14} {details}")
+            else:
+                print(f"  {key:<28} {value}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline Akita WeatherBot benchmarks")
+    parser.add_argument("--nodes", type=int, default=50, help="Simulated nodes sending commands")
+    parser.add_argument("--rounds", type=int, default=10, help="Bursts of one command per node")
+    parser.add_argument("--parse-iterations", type=int, default=200)
+    parser.add_argument("--storm-alerts", type=int, default=600, help="Alerts in the generated storm feed")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Simulated network latency per request")
+    parser.add_argument("--callers", type=int, default=20, help="Concurrent callers in the single-flight check")
+    parser.add_argument("--reply-fanout", default="", choices=("", "broadcast", "batch"),
+                        help="REPLY_FANOUT mode for the load phase")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="Also write the report to this file")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    rng = random.Random(args.seed)
+    storm = storm_feed(args.storm_alerts, seed=args.seed)
+    codes = [code for code, _ in site_codes()]
+    stand_in = ECCCStandIn(alert_feed=storm, latency=args.latency_ms / 1000.0).start()
+    report = {}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        settings = bench_settings(workdir, REPLY_FANOUT=args.reply_fanout)
+
+        service = make_service(stand_in, settings)
+        report['parse'] = bench_parse(service, args.parse_iterations, storm)
+        report['fetch'] = bench_fetch(service, stand_in, codes)
+        service.close()
+        report['single_flight'] = check_single_flight(stand_in, settings, args.callers)
+
+        import akitabot
+        bot = akitabot.AkitaBot(settings)
+        stand_in.configure(bot.weather_service)
+        radio = FakeRadio(ms_per_byte=settings.get('TX_AIRTIME_MS_PER_BYTE', 8),
+                          overhead_ms=settings.get('TX_AIRTIME_OVERHEAD_MS', 300))
+        nodes = [0x1000 + i for i in range(args.nodes)]
+        for node in nodes:
+            radio.add_node(node)
+        bot.add_interface(radio)
+        bot.on_connection(radio)
+        bot._started = True
+        for transmitter in bot.transmitters.values():
+            transmitter.start()
+        bot.command_queue.start()
+        try:
+            report['load'] = bench_load(bot, radio, nodes, args.rounds, rng)
+        finally:
+            bot.command_queue.stop()
+            for transmitter in bot.transmitters.values():
+                transmitter.stop()
+            bot.weather_service.close()
+
+        report['memory'] = bench_memory(stand_in, settings, codes, storm)
+
+    stand_in.stop()
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Local HTTP stand-in for the ECCC datamart: serves the recorded fixtures at
+the same paths as dd.weather.gc.ca / weather.gc.ca, with ETag revalidation.
+"""
+import hashlib
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fixtures import citypage, read
+
+CITYPAGE_PATH = re.compile(r'^/citypage_weather/xml/([A-Z]{2})/(s\d{7})_e\.xml$')
+
+
+class ECCCStandIn:
+    """
+    Serves citypage files, the site list and a CAP feed on 127.0.0.1.
+    `bump()` simulates ECCC publishing new files (changing every ETag), and
+    `latency` adds a fixed delay per request to mimic the network.
+    """
+
+    def __init__(self, alert_feed=None, latency=0.0):
+        self.alert_feed = alert_feed or read('cap_alert.xml')
+        self.latency = latency
+        self.generation = 0
+        self.requests = 0
+        self.not_modified = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def configure(self, service):
+        """Points an ECCCWeatherService (and its site list) at this stand-in."""
+        service.BASE_URL = f"{self.base_url}/citypage_weather/xml"
+        service.ALERT_URL = f"{self.base_url}/rss/cap/canada_e.xml"
+        service.site_list.SITE_LIST_URL = f"{self.base_url}/citypage_weather/docs/site_list_en.csv"
+
+    def bump(self):
+        with self._lock:
+            self.generation += 1
+
+    def body_for(self, path):
+        if path == '/rss/cap/canada_e.xml':
+            return self.alert_feed
+        if path == '/citypage_weather/docs/site_list_en.csv':
+            return read('site_list_en.csv')
+        match = CITYPAGE_PATH.match(path)
+        if match:
+            return citypage(match.group(2))
+        return None
+
+    def start(self):
+        stand_in = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive, like the real datamart
+
+            def do_GET(self):
+                if stand_in.latency:
+                    time.sleep(stand_in.latency)
+                body = stand_in.body_for(self.path)
+                with stand_in._lock:
+                    stand_in.requests += 1
+                    generation = stand_in.generation
+                if body is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                etag = f'"{hashlib.md5(body).hexdigest()[:16]}-{generation}"'
+                if self.headers.get('If-None-Match') == etag:
+                    with stand_in._lock:
+                        stand_in.not_modified += 1
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                with stand_in._lock:
+                    stand_in.bytes_sent += len(body)
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/xml')
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="eccc-stand-in", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
@@ -0,0 +1,125 @@
+import math
+from array import array
+
+
+class Polygon:
+    """A CAP area polygon with its bounding box, stored as compact coordinate arrays."""
+    __slots__ = ('lats', 'lons', 'min_lat', 'max_lat', 'min_lon', 'max_lon')
+
+    def __init__(self, points):
+        self.lats = array('d', (lat for lat, _ in points))
+        self.lons = array('d', (lon for _, lon in points))
+        self.min_lat, self.max_lat = min(self.lats), max(self.lats)
+        self.min_lon, self.max_lon = min(self.lons), max(self.lons)
+
+    @classmethod
+    def parse(cls, text):
+        """
+        Parses a CAP polygon ("lat,lon lat,lon ..."), or returns None if it is
+        malformed or has fewer than three vertices.
+        """
+        points = []
+        for pair in (text or '').split():
+            lat, _, lon = pair.partition(',')
+            try:
+                points.append((float(lat), float(lon)))
+            except ValueError:
+                return None
+        return cls(points) if len(points) >= 3 else None
+
+    def in_bbox(self, lat, lon):
+        return self.min_lat <= lat <= self.max_lat and self.min_lon <= lon <= self.max_lon
+
+    def contains(self, lat, lon):
+        """Ray-casting point-in-polygon test, after a bounding-box check."""
+        if not self.in_bbox(lat, lon):
+            return False
+        lats, lons = self.lats, self.lons
+        inside = False
+        j = len(lats) - 1
+        for i in range(len(lats)):
+            if (lats[i] > lat) != (lats[j] > lat):
+                crossing = lons[i] + (lat - lats[i]) * (lons[j] - lons[i]) / (lats[j] - lats[i])
+                if lon < crossing:
+                    inside = not inside
+            j = i
+        return inside
+
+
+class PointIndex:
+    """
+    Uniform grid over the configured alert locations. A polygon only visits
+    the grid cells its bounding box overlaps, so the point-in-polygon test runs
+    on nearby candidates instead of every configured location.
+    """
+    CELL_DEGREES = 0.5
+
+    def __init__(self, points, cell_degrees=CELL_DEGREES):
+        self.cell = cell_degrees
+        self.points = dict(points)  # label -> (lat, lon)
+        self._grid = {}
+        for label, (lat, lon) in self.points.items():
+            self._grid.setdefault(self._cell(lat, lon), []).append(label)
+
+    def _cell(self, lat, lon):
+        return math.floor(lat / self.cell), math.floor(lon / self.cell)
+
+    def __len__(self):
+        return len(self.points)
+
+    def within(self, polygon):
+        """Returns the labels of the points inside the polygon."""
+        low_row, low_col = self._cell(polygon.min_lat, polygon.min_lon)
+        high_row, high_col = self._cell(polygon.max_lat, polygon.max_lon)
+        if (high_row - low_row + 1) * (high_col - low_col + 1) > len(self._grid):
+            # A polygon spanning more cells than are occupied: walk the occupied ones.
+            cells = [c for c in self._grid if low_row <= c[0] <= high_row and low_col <= c[1] <= high_col]
+        else:
+            cells = [(row, col) for row in range(low_row, high_row + 1) for col in range(low_col, high_col + 1)]
+        found = set()
+        for cell in cells:
+            for label in self._grid.get(cell, ()):
+                if polygon.contains(*self.points[label]):
+                    found.add(label)
+        return found
+
+
+class AlertAreaMatcher:
+    """
+    Decides which configured locations a CAP alert covers, from its <area>
+    polygons and geocodes. Built once from settings; each alert version is
+    matched once at extraction time. With no points or regions configured,
+    falls back to matching the province code in the area descriptions, unless
+    province_fallback is False (then nothing matches).
+    """
+
+    def __init__(self, province_code, points=None, regions=None, province_fallback=True):
+        self.province_code = province_code
+        self.index = PointIndex(points or {})
+        self.regions = {str(code) for code in (regions or [])}
+        self.province_fallback = province_fallback
+
+    @property
+    def province_only(self):
+        return self.province_fallback and not self.index and not self.regions
+
+    def match(self, areas):
+        """
+        `areas` is a list of (area description, polygon texts, geocode values).
+        Returns the set of matched location labels (or region codes); empty if
+        the alert is not relevant here.
+        """
+        if self.province_only:
+            if any(self.province_code in desc for desc, _, _ in areas):
+                return {self.province_code}
+            return set()
+
+        matched = set()
+        for _, polygons, geocodes in areas:
+            matched.update(code for code in geocodes if code in self.regions)
+            if self.index:
+                for text in polygons:
+                    polygon = Polygon.parse(text)
+                    if polygon:
+                        matched |= self.index.within(polygon)
+        return matched
@@ -0,0 +1,178 @@
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime
+
+_REF_ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def _parse_cap_time(value):
+    """Converts a CAP timestamp (ISO 8601 with offset) to epoch seconds, or None."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        return None
+
+
+def alert_ref(identifier):
+    """Short, stable reference for a CAP identifier (4 base-36 characters) used on air."""
+    value = zlib.crc32(identifier.encode('utf-8')) % 36 ** 4
+    ref = ""
+    for _ in range(4):
+        value, digit = divmod(value, 36)
+        ref = _REF_ALPHABET[digit] + ref
+    return ref
+
+
+class AlertStore:
+    """
+    Durable record of broadcast alerts, so restarts do not rebroadcast every
+    active alert to the mesh. Records are kept per channel (the radios a bot
+    process drives): processes sharing the database file and a channel
+    broadcast each alert only once between them, while bots on other radios
+    still broadcast it on theirs.
+    Backed by SQLite in WAL mode, keyed by channel and CAP identifier. Only unexpired rows
+    are loaded at startup, and old rows are evicted by time. A row replaced by
+    a CAP Update or Cancel is evicted early: the replacing row's refs keep its
+    identifier known as handled.
+    """
+    EXPIRY_GRACE = 86400  # Keep rows a day past their expiry
+    DEFAULT_RETENTION = 7 * 86400  # For alerts without an expiry time
+    LEGACY_CHANNEL = '*'  # Rows from before records were per channel; they count for every channel
+
+    def __init__(self, path, retention=DEFAULT_RETENTION, channel=''):
+        self.path = path or ':memory:'
+        self.retention = retention
+        self.channel = channel
+        self._lock = threading.Lock()
+        self._ids = set()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        if self.path != ':memory:':
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS broadcast_alerts ("
+            " channel TEXT NOT NULL,"
+            " identifier TEXT NOT NULL,"
+            " refs TEXT NOT NULL DEFAULT '',"
+            " expires REAL,"
+            " superseded_by TEXT,"
+            " sent_at REAL NOT NULL,"
+            " PRIMARY KEY (channel, identifier))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS broadcast_alerts_expires ON broadcast_alerts (expires)")
+        self._migrate()
+
+        self.evict()
+        self._ids = self._load_ids()
+        logging.info(f"Loaded {len(self._ids)} broadcast alert records from {self.path}.")
+
+    def __contains__(self, identifier):
+        return identifier in self._ids or self._stored(identifier)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def any_sent(self, identifiers):
+        """True if any of the given identifiers has been broadcast (or replaced by one that was)."""
+        return any(i in self for i in identifiers)
+
+    def _migrate(self):
+        """Moves records from the old single-channel table, kept as legacy rows until they expire."""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Checked inside the transaction, since another process may be migrating too
+            if not self._conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sent_alerts'").fetchone():
+                self._conn.execute("COMMIT")
+                return
+            self._conn.execute(
+                "INSERT OR IGNORE INTO broadcast_alerts (channel, identifier, refs, expires, superseded_by, sent_at)"
+                " SELECT ?, identifier, refs, expires, superseded_by, sent_at FROM sent_alerts",
+                (self.LEGACY_CHANNEL,),
+            )
+            self._conn.execute("DROP TABLE sent_alerts")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def _load_ids(self):
+        """Identifiers of alerts broadcast on this channel plus every alert they replaced."""
+        ids = set()
+        for identifier, refs in self._conn.execute("SELECT identifier, refs FROM broadcast_alerts"
+                                                   " WHERE channel IN (?, ?)", (self.channel, self.LEGACY_CHANNEL)):
+            ids.add(identifier)
+            ids.update(refs.split())
+        return ids
+
+    def _stored(self, identifier):
+        # Another bot process sharing this database may have sent it since we loaded.
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM broadcast_alerts WHERE channel IN (?, ?)"
+                " AND (identifier = ? OR ' ' || refs || ' ' LIKE ?)",
+                (self.channel, self.LEGACY_CHANNEL, identifier, f"% {identifier} %"),
+            ).fetchone()
+            if row:
+                self._ids.add(identifier)
+        return row is not None
+
+    def claim(self, alert):
+        """
+        Records an alert as broadcast, unless it already was on this channel (by
+        this or another bot process sharing the database). Returns True if the caller should
+        broadcast it. Alerts it references (via CAP Update or Cancel) are marked
+        as superseded by it.
+        """
+        now = time.time()
+        references = alert.get('references') or []
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                legacy = self._conn.execute("SELECT 1 FROM broadcast_alerts WHERE channel = ? AND identifier = ?",
+                                            (self.LEGACY_CHANNEL, alert['id'])).fetchone()
+                cursor = None if legacy else self._conn.execute(
+                    "INSERT OR IGNORE INTO broadcast_alerts (channel, identifier, refs, expires, superseded_by, sent_at)"
+                    " VALUES (?, ?, ?, ?, NULL, ?)",
+                    (self.channel, alert['id'], " ".join(references), _parse_cap_time(alert.get('expires')), now),
+                )
+                claimed = cursor is not None and cursor.rowcount == 1
+                if claimed:
+                    self._conn.executemany(
+                        "UPDATE broadcast_alerts SET superseded_by = ? WHERE channel = ? AND identifier = ?",
+                        [(alert['id'], self.channel, ref) for ref in references],
+                    )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            self._ids.add(alert['id'])
+            self._ids.update(references)
+        return claimed
+
+    def evict(self, now=None):
+        """
+        Deletes records for alerts that expired (or were sent) long ago, and for
+        alerts superseded by a recorded Update or Cancel.
+        """
+        now = now or time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM broadcast_alerts WHERE (expires IS NOT NULL AND expires < ?)"
+                " OR (expires IS NULL AND sent_at < ?)"
+                " OR superseded_by IN (SELECT identifier FROM broadcast_alerts)",
+                (now - self.EXPIRY_GRACE, now - self.retention),
+            )
+            if cursor.rowcount:
+                self._ids = self._load_ids()
+        if cursor.rowcount:
+            logging.info(f"Evicted {cursor.rowcount} expired alert records.")
+        return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
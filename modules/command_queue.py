@@ -0,0 +1,136 @@
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from modules.metrics import metrics
+
+
+class RecentPackets:
+    """
+    Remembers recently seen packet ids so mesh retransmissions of the same
+    packet are handled only once.
+    """
+
+    def __init__(self, ttl=600, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._seen = OrderedDict()  # (sender, packet id) -> first seen
+        self._lock = threading.Lock()
+
+    def check_and_add(self, sender, packet_id):
+        """Returns True if the packet was already seen, otherwise records it."""
+        if packet_id is None:
+            return False
+        key = (sender, packet_id)
+        now = time.monotonic()
+        with self._lock:
+            while self._seen:
+                oldest_key, seen_at = next(iter(self._seen.items()))
+                if now - seen_at < self.ttl and len(self._seen) < self.max_entries:
+                    break
+                del self._seen[oldest_key]
+            if key in self._seen:
+                return True
+            self._seen[key] = now
+            return False
+
+
+class TokenBucketLimiter:
+    """Per-sender token bucket: `rate` requests per minute with bursts up to `burst`."""
+
+    def __init__(self, rate=6, burst=3, max_senders=1024):
+        self.max_senders = max_senders
+        self._buckets = OrderedDict()  # sender -> (tokens, last update)
+        self._lock = threading.Lock()
+        self.configure(rate, burst)
+
+    def configure(self, rate, burst):
+        """Changes the limits; senders keep their current tokens (capped at the new burst)."""
+        with self._lock:
+            self.rate = rate / 60.0
+            self.burst = burst
+
+    def allow(self, sender):
+        """Takes a token for the sender; returns False if they are over their limit."""
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(sender, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[sender] = (tokens, now)
+            if len(self._buckets) > self.max_senders:
+                self._buckets.popitem(last=False)
+            return allowed
+
+
+class CommandQueue:
+    """
+    Bounded inbound queue served by a small worker pool, so slow commands
+    (network fetches, formatting) never run on the radio library's reader
+    thread. submit() never blocks: it returns False when the queue is full.
+    """
+
+    def __init__(self, handler, workers=2, max_size=32):
+        self.handler = handler
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=max_size)
+        self._threads = []
+        self._stats_lock = threading.Lock()
+        self.stats = {'submitted': 0, 'shed': 0, 'processed': 0, 'failed': 0,
+                      'total_wait': 0.0, 'max_wait': 0.0}
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"command-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=5):
+        """Stops the workers after the commands already queued ahead of the stop marker."""
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, *args):
+        """Queues handler(*args). Returns False (without blocking) if the queue is full."""
+        try:
+            self._queue.put_nowait((time.monotonic(), args))
+        except queue.Full:
+            with self._stats_lock:
+                self.stats['shed'] += 1
+            return False
+        with self._stats_lock:
+            self.stats['submitted'] += 1
+        return True
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            queued_at, args = item
+            wait = time.monotonic() - queued_at
+            metrics.observe('inbound_wait', wait)
+            with self._stats_lock:
+                self.stats['total_wait'] += wait
+                self.stats['max_wait'] = max(self.stats['max_wait'], wait)
+            if wait > 5:
+                logging.warning(f"Command waited {wait:.1f}s in the inbound queue (depth {self.depth()}).")
+            try:
+                self.handler(*args)
+                outcome = 'processed'
+            except Exception as e:
+                logging.error(f"Command worker failed: {e}", exc_info=True)
+                outcome = 'failed'
+            with self._stats_lock:
+                self.stats[outcome] += 1
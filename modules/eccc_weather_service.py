@@ -1,173 +1,963 @@
-import requests
+import json
 import logging
+import threading
 import time
-from lxml import etree
+import io
+import re
+from concurrent.futures import ThreadPoolExecutor, wait
+from modules.alert_area import AlertAreaMatcher
+from modules.alert_store import AlertStore, alert_ref
+from modules.forecast_cache import ForecastCache
+from modules.forecast_model import (
+    MISSING_TEMP, CurrentConditions, DailyForecast, DailyPeriod, HourlyForecast, parse_float, parse_icon, parse_int,
+    utc_stamp_to_epoch, utc_stamp_to_local_hour,
+)
+from modules.metrics import metrics
+from modules.notifications import cap_file_for_province
+from modules.observation_history import ObservationHistory
+from modules.scheduler import next_hourly
+from modules.shared_cache import SharedCache
+from modules.single_flight import SingleFlight
+from modules.site_list import Site, SiteList
+from modules.snapshot import instance_path, read_snapshot, write_snapshot
+
+# requests and lxml are imported where they are first used, keeping them off the
+# startup path so a restored snapshot can be served before they are loaded.
+
+CAP_NS = 'urn:oasis:names:tc:emergency:cap:1.2'
+CAP_ALERT_TAG = f'{{{CAP_NS}}}alert'
+
+# Returned by _make_request when the server answers 304 Not Modified.
+NOT_MODIFIED = object()
+
+# English citypage file for a site in a datamart announcement (old and new path layouts)
+CITYPAGE_FILE = re.compile(r'(s\d{7})_(?:e|en)\.xml$')
 
 class ECCCWeatherService:
     """
     Handles all data fetching and parsing from Environment and Climate Change Canada (ECCC).
-    Includes caching to minimize redundant API calls.
+    Includes caching to minimize redundant API calls, and an optional background
+    refresher that renews the cache ahead of expiry so commands never wait on ECCC.
     """
     BASE_URL = "https://dd.weather.gc.ca/citypage_weather/xml"
     ALERT_URL = "https://weather.gc.ca/rss/cap/canada_e.xml"
+    FORECAST_CACHE_DURATION = 3600  # 1 hour
+    ALERT_CACHE_DURATION = 300  # 5 minutes
+    # Sites other than the default are only refreshed ahead while users keep asking for them
+    REFRESH_REQUEST_WINDOW = 2 * FORECAST_CACHE_DURATION
+    REFRESH_RETRY_DELAY = 60
+    SHARED_FRESHNESS = 300  # Reuse another process's download if checked this recently
+    SHARED_WAIT = 15  # How long to wait for another process's in-flight download
 
-    def __init__(self, settings):
+    def __init__(self, settings, instance=''):
+        """
+        `instance` names the radios this bot process drives. It keeps alert
+        broadcast records and the snapshot apart from other processes'.
+        """
         self.location_code = settings.get('ECCC_LOCATION_CODE')
         self.province_code = settings.get('ALERT_PROVINCE_CODE')
         self.user_agent = f"{settings.get('USER_AGENT_APP', 'AkitaWeatherBot/1.0')} ({settings.get('USER_AGENT_EMAIL', 'user@example.com')})"
         
+        if not self.location_code or not self.province_code:
+            raise ValueError("ECCC_LOCATION_CODE and ALERT_PROVINCE_CODE must be set in settings.")
+
+        # Locations: the configured default plus any site looked up by name or code
+        self.default_site = Site(self.location_code.lower(), None, self.province_code)
+        self.site_list = SiteList(settings.get('SITE_LIST_PATH', 'site_list_en.csv'), self._make_request)
+        self._sites = {self.default_site.code: self.default_site}
+        self._requested_at = {}  # site code -> last time a user asked for its forecast
+
         # Caching
-        self.forecast_cache = {'daily': None, 'hourly': None}
-        self.forecast_cache_time = {'daily': 0, 'hourly': 0}
+        self.forecast_cache = ForecastCache(max_bytes=settings.get('FORECAST_CACHE_MAX_BYTES', 2_000_000))
+        # Recent observations per site, taken from each parsed citypage (no extra downloads)
+        self.observations = ObservationHistory(settings.get('OBSERVATION_HISTORY_SIZE', 72))
+        self.forecast_listeners = []
+        self.alert_listeners = []
         self.alert_cache = None
         self.alert_cache_time = 0
-        self.sent_alert_ids = set() # To track broadcasted alerts and avoid duplicates
+        # Alert relevance: configured points/regions, or the whole province if none
+        self.alert_locations = settings.get('ALERT_LOCATIONS') or []
+        self.alert_regions = settings.get('ALERT_REGIONS') or []
+        self._area_matcher = None  # Built on first ingest, since names need the site list
+        self._area_matcher_partial = False  # Built while the site list was unavailable
+        # Incremental CAP state: identifier -> (version, alert dict or None if not relevant here)
+        self._alert_index = {}
+        self._pending_alert_changes = {}  # identifier -> alert dict with a 'change' key
+        self._alert_generation = 0  # Bumped when the alert area changes mid-ingest
+        self._alert_lock = threading.Lock()
 
-        if not self.location_code or not self.province_code:
-            raise ValueError("ECCC_LOCATION_CODE and ALERT_PROVINCE_CODE must be set in settings.")
+        # Bounded pool for concurrent forecast fetches; one in-flight fetch per site
+        fetch_workers = settings.get('FETCH_WORKERS', 2)
+        self._fetch_pool = ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix="eccc-fetch")
+        # One in-flight fetch and parse per URL; concurrent callers wait on its result
+        self._single_flight = SingleFlight()
+
+        # Pooled keep-alive session (created on first request) and conditional
+        # GET validators (ETag / Last-Modified) per URL
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._pool_size = max(4, fetch_workers + 2)
+        self.validators = {}
+        # url -> time from which a push announcement makes it due for refetch; cleared when a refresh starts
+        self._announced_at = {}
+        # Announced CAP files force at most one alert refetch per NOTIFY_ALERT_DEBOUNCE seconds
+        self.alert_push_debounce = settings.get('NOTIFY_ALERT_DEBOUNCE', 60)
+        self.next_alert_push = 0
+        self.http_stats = {'requests': 0, 'not_modified': 0, 'bytes_downloaded': 0, 'bytes_saved': 0}
+        self._stats_lock = threading.Lock()
+        # Durable record of broadcast alerts, so restarts don't rebroadcast them
+        self.sent_alert_ids = AlertStore(settings.get('ALERT_STORE_PATH', 'alert_state.db'), channel=instance)
+
+        # Background refresh-ahead
+        self.forecast_refresh_offset = settings.get('FORECAST_REFRESH_OFFSET', 600)
+        self.alert_refresh_interval = settings.get('ALERT_CHECK_INTERVAL', 300)
+        self.refresh_jitter = settings.get('REFRESH_JITTER', 60)
+        self._background_refresh = False
+
+        # Optional cache shared by every bot process on this host
+        shared_path = settings.get('SHARED_CACHE_PATH')
+        self.shared_cache = SharedCache(shared_path) if shared_path else None
+        self._shared_seen = {}  # url -> changed_at of the shared payload we hold
+
+        # Warm-start snapshot of parsed forecasts, alert state and HTTP validators
+        self.snapshot_path = instance_path(settings.get('SNAPSHOT_PATH', 'weatherbot_snapshot.json.gz'), instance)
+
+    def apply_settings(self, settings):
+        """
+        Applies reloaded settings in place, keeping cached forecasts, HTTP
+        validators and the sent-alert store. A changed alert area only resets
+        alert relevance: the feed is re-ingested from scratch on the next
+        check, and alerts already broadcast are still never repeated.
+        Returns True if the alert area changed.
+        """
+        location_code = settings['ECCC_LOCATION_CODE'].lower()
+        province_code = settings['ALERT_PROVINCE_CODE']
+        alert_locations = settings.get('ALERT_LOCATIONS') or []
+        alert_regions = settings.get('ALERT_REGIONS') or []
+        user_agent = f"{settings.get('USER_AGENT_APP', 'AkitaWeatherBot/1.0')} ({settings.get('USER_AGENT_EMAIL', 'user@example.com')})"
+
+        if location_code != self.default_site.code or province_code != self.province_code:
+            # Keep the site (and its name) if it was already looked up; the old one stays cached
+            site = self._sites.get(location_code)
+            if site is None or site.name is None:
+                site = Site(location_code, None, province_code)
+            self._sites[location_code] = site
+            self.default_site = site
+            logging.info(f"Default location is now {location_code}.")
+            if self.forecast_cache.get(location_code) is None:
+                self._fetch_forecast(site)
+        self.location_code = settings['ECCC_LOCATION_CODE']
+
+        self.forecast_cache.max_bytes = settings.get('FORECAST_CACHE_MAX_BYTES', 2_000_000)
+        self.forecast_refresh_offset = settings.get('FORECAST_REFRESH_OFFSET', 600)
+        self.refresh_jitter = settings.get('REFRESH_JITTER', 60)
+        self.alert_push_debounce = settings.get('NOTIFY_ALERT_DEBOUNCE', 60)
+        if user_agent != self.user_agent:
+            self.user_agent = user_agent
+            if self._session is not None:
+                self._session.headers['User-Agent'] = user_agent
+
+        area_changed = (province_code, alert_locations, alert_regions) != \
+            (self.province_code, self.alert_locations, self.alert_regions)
+        if area_changed:
+            with self._alert_lock:
+                self.province_code = province_code
+                self.alert_locations = alert_locations
+                self.alert_regions = alert_regions
+                self._area_matcher = None
+                self._area_matcher_partial = False
+                self._alert_index = {}
+                self._pending_alert_changes.clear()
+                self._alert_generation += 1
+            # Force a full download so every alert is matched against the new area
+            self.validators.pop(self.ALERT_URL, None)
+            self._shared_seen.pop(self.ALERT_URL, None)
+            self._announced_at[self.ALERT_URL] = time.time()
+            logging.info("Alert area changed; alerts will be re-matched on the next check.")
+        return area_changed
+
+    @property
+    def session(self):
+        """The pooled HTTP session, created on first use."""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self._pool_size)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    session.headers.update({'User-Agent': self.user_agent, 'Accept-Encoding': 'gzip, deflate'})
+                    self._session = session
+        return self._session
 
-    def _make_request(self, url):
+    def _make_request(self, url, conditional=False):
         """
-        Private helper to make HTTP requests with proper headers and error handling.
+        Private helper to make HTTP requests over the pooled session with error handling.
+        With conditional=True, the stored ETag/Last-Modified validators for the URL are
+        sent and NOT_MODIFIED is returned if the server answers 304.
         """
-        headers = {'User-Agent': self.user_agent}
+        import requests
+
+        headers = {}
+        validator = self.validators.get(url) if conditional else None
+        if validator:
+            if validator.get('etag'):
+                headers['If-None-Match'] = validator['etag']
+            if validator.get('last_modified'):
+                headers['If-Modified-Since'] = validator['last_modified']
+
         try:
-            response = requests.get(url, headers=headers, timeout=10)
+            with metrics.span('http_fetch'):
+                response = self.session.get(url, headers=headers, timeout=10)
+            self._count('requests')
+            if response.status_code == 304 and validator:
+                self._count('not_modified')
+                self._count('bytes_saved', validator.get('size', 0))
+                logging.info(f"{url} not modified since last fetch.")
+                return NOT_MODIFIED
             response.raise_for_status() # Raises an HTTPError for bad responses (4xx or 5xx)
-            return response.content
         except requests.exceptions.RequestException as e:
             logging.error(f"Failed to fetch data from {url}: {e}")
             return None
 
-    def get_forecast(self, hourly=False):
+        content = response.content
+        # Content-Length is the on-the-wire (possibly gzip-compressed) size.
+        try:
+            wire_size = int(response.headers.get('Content-Length', len(content)))
+        except ValueError:
+            wire_size = len(content)
+        self._count('bytes_downloaded', wire_size)
+        self._count('bytes_saved', max(0, len(content) - wire_size))
+
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if etag or last_modified:
+            self.validators[url] = {'etag': etag, 'last_modified': last_modified, 'size': wire_size}
+        else:
+            self.validators.pop(url, None)
+        return content
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self.http_stats[name] += amount
+
+    def _forecast_url(self, site):
+        # URL format is BASE_URL/{PROVINCE_CODE}/{LOCATION_CODE}_e.xml
+        return f"{self.BASE_URL}/{site.province}/{site.code}_e.xml"
+
+    def resolve_location(self, query=None):
         """
-        Fetches daily or hourly forecast data for the configured location.
-        Uses a cache to avoid fetching data more than once per hour.
+        Returns the Site for a place name or site code, or the default site if no
+        query is given. Returns None if the location is unknown.
         """
-        cache_key = 'hourly' if hourly else 'daily'
-        cache_duration = 3600  # 1 hour
+        if not query:
+            return self.default_site
+        if query.strip().lower() == self.default_site.code:
+            return self.default_site
+        site = self.site_list.resolve(query)
+        if site:
+            self._sites.setdefault(site.code, site)
+        return site
 
-        if time.time() - self.forecast_cache_time[cache_key] < cache_duration and self.forecast_cache[cache_key]:
-            logging.info(f"Using cached {cache_key} forecast data.")
-            return self.forecast_cache[cache_key]
+    def get_forecast_entry(self, site=None):
+        """
+        Returns the CachedForecast (daily, hourly and version) for a site.
+        Cached data is served even once it is older than an hour while the
+        background refresher keeps the site warm (stale-while-revalidate); otherwise
+        an expired cache is refetched, sharing any fetch already in flight for the site.
+        """
+        site = site or self.default_site
+        kept_warm = self.is_refreshing() and self._recently_requested(site.code)
+        self._requested_at[site.code] = time.time()
+        entry = self.forecast_cache.get(site.code)
 
-        # URL format is BASE_URL/{PROVINCE_CODE}/{LOCATION_CODE}_e.xml
-        forecast_url = f"{self.BASE_URL}/{self.province_code}/{self.location_code}_e.xml"
-        xml_data = self._make_request(forecast_url)
+        if entry and (entry.age() < self.FORECAST_CACHE_DURATION or kept_warm):
+            logging.debug(f"Using cached forecast data for {site.code} ({int(entry.age())}s old).")
+            return entry
+
+        if not self._fetch_forecast(site).result() and entry:
+            logging.warning(f"Forecast refresh failed. Serving stale data for {site.code} ({int(entry.age())}s old).")
+        return self.forecast_cache.get(site.code)
+
+    def add_forecast_listener(self, callback):
+        """Registers callback(site, entry), called whenever new forecast data is parsed."""
+        self.forecast_listeners.append(callback)
 
+    def add_alert_listener(self, callback):
+        """Registers callback(), called whenever a refresh finds new, updated or cancelled alerts."""
+        self.alert_listeners.append(callback)
+
+    def _fetch_forecast(self, site):
+        """Submits a refresh for a site to the fetch pool, or joins one already in flight."""
+        return self._single_flight.submit(self._forecast_url(site), self._refresh_forecast, site,
+                                          executor=self._fetch_pool)
+
+    def refresh_forecast(self, site=None):
+        """
+        Downloads and parses the citypage forecast for a site, replacing its cache entry.
+        Concurrent refreshes of the same site share a single fetch and parse.
+        Returns False (leaving any cached data in place) if the fetch fails.
+        """
+        site = site or self.default_site
+        return self._single_flight.do(self._forecast_url(site), self._refresh_forecast, site)
+
+    def _refresh_forecast(self, site):
+        forecast_url = self._forecast_url(site)
+        shared = self._await_shared(forecast_url, self._shared_freshness(forecast_url, self.SHARED_FRESHNESS))
+        if shared:
+            return self._apply_shared_forecast(site, forecast_url, shared)
+        try:
+            return self._download_forecast(site, forecast_url)
+        finally:
+            self._release_shared(forecast_url)
+
+    def _download_forecast(self, site, forecast_url):
+        has_cache = self.forecast_cache.get(site.code) is not None
+        xml_data = self._make_request(forecast_url, conditional=has_cache)
+
+        if xml_data is NOT_MODIFIED:
+            # Nothing changed upstream; skip the parse and extend the cache lifetime.
+            self.forecast_cache.touch(site.code)
+            self._touch_shared(forecast_url)
+            return True
         if not xml_data:
-            return None
+            return False
         
-        logging.info(f"Successfully fetched new {cache_key} forecast data.")
-        root = etree.fromstring(xml_data)
+        from lxml import etree
 
-        # Parse both daily and hourly forecasts at once, since they are in the same file
-        self.forecast_cache['daily'] = self._parse_daily_forecast(root)
-        self.forecast_cache['hourly'] = self._parse_hourly_forecast(root)
-        
-        # Update cache times for both
-        self.forecast_cache_time['daily'] = time.time()
-        self.forecast_cache_time['hourly'] = time.time()
+        logging.info(f"Successfully fetched new forecast data for {site.code}.")
+        with metrics.span('parse_forecast'):
+            root = etree.fromstring(xml_data)
+            # Parse the daily and hourly forecasts and current conditions at once, since they
+            # are in the same file, then swap the new entry into the cache in one step.
+            daily, hourly = self._parse_daily_forecast(root), self._parse_hourly_forecast(root)
+            current = self._parse_current_conditions(root)
+        self._store_forecast(site, daily, hourly, current)
+        # Other processes on the host get the parsed result, not the XML.
+        self._share(forecast_url, json.dumps({'daily': daily.to_state(), 'hourly': hourly.to_state(),
+                                              'current': current.to_state() if current else None},
+                                             separators=(',', ':')).encode('utf-8'))
+        return True
+
+    def _apply_shared_forecast(self, site, forecast_url, shared):
+        """Adopts a forecast another bot process on this host downloaded and parsed."""
+        if self._shared_seen.get(forecast_url) == shared.changed_at and self.forecast_cache.touch(site.code):
+            return True
+        state = json.loads(shared.payload)
+        self._adopt_shared(forecast_url, shared)
+        logging.info(f"Using forecast data for {site.code} shared by another bot process.")
+        self._store_forecast(site, DailyForecast.from_state(state['daily']), HourlyForecast.from_state(state['hourly']),
+                             CurrentConditions.from_state(state.get('current')))
+        return True
+
+    def _store_forecast(self, site, daily, hourly, current=None):
+        trends = self.observations.record(site.code, current)
+        entry = self.forecast_cache.put(site.code, daily, hourly, current=current, trends=trends)
+        for callback in self.forecast_listeners:
+            try:
+                callback(site, entry)
+            except Exception as e:
+                logging.error(f"Forecast listener failed: {e}")
+        return entry
 
-        return self.forecast_cache[cache_key]
+    def _recently_requested(self, code):
+        """True for the default site, or a site a user asked for within REFRESH_REQUEST_WINDOW."""
+        if code == self.default_site.code:
+            return True
+        return time.time() - self._requested_at.get(code, 0) < self.REFRESH_REQUEST_WINDOW
+
+    def refresh_all_forecasts(self):
+        """
+        Refreshes the default site and every cached site users asked for recently,
+        concurrently on the fetch pool. Other cached sites are left to age out.
+        Returns False if any refresh failed.
+        """
+        codes = [self.default_site.code] + [c for c in self.forecast_cache.locations()
+                                            if c != self.default_site.code and self._recently_requested(c)]
+        futures = [self._fetch_forecast(self._sites[code]) for code in codes if code in self._sites]
+        done, _ = wait(futures)
+        return all(not f.exception() and f.result() for f in done)
 
     def _parse_daily_forecast(self, root):
-        """Parses the daily forecast data from the XML tree."""
-        forecasts = []
+        """Parses the daily forecast data from the XML tree into a DailyForecast."""
+        periods = []
         # XPath to get each daily forecast entry
         for entry in root.xpath('//forecastGroup/forecast'):
-            period = entry.findtext('period')
-            icon = entry.findtext('abbreviatedForecast/iconCode')
-            temp = entry.findtext('temperatures/temperature')
-            summary = entry.findtext('textSummary')
-            
-            forecasts.append({
-                'period': period,
-                'icon': icon,
-                'temp': temp,
-                'summary': summary
-            })
-        return forecasts
+            periods.append(DailyPeriod(
+                entry.findtext('period'),
+                parse_icon(entry.findtext('abbreviatedForecast/iconCode')),
+                parse_int(entry.findtext('temperatures/temperature')),
+                entry.findtext('textSummary'),
+            ))
+        return DailyForecast(periods)
+
+    def _parse_current_conditions(self, root):
+        """
+        Parses the currentConditions block into CurrentConditions, or returns
+        None if the site has no observing station or no observation time.
+        """
+        block = root.find('currentConditions')
+        if block is None:
+            return None
+        observed_at, utc_offset = None, 0.0
+        for stamp in block.findall('dateTime'):
+            if stamp.get('zone') == 'UTC':
+                observed_at = utc_stamp_to_epoch(stamp.findtext('timeStamp'))
+            elif stamp.get('UTCOffset'):
+                utc_offset = parse_float(stamp.get('UTCOffset'), 0.0)
+        if observed_at is None:
+            return None
+        if not utc_offset:
+            # Some files only carry the UTC observation time; use the forecast's local offset
+            for stamp in root.xpath('//dateTime[@zone!="UTC"][@UTCOffset]'):
+                utc_offset = parse_float(stamp.get('UTCOffset'), 0.0)
+                break
+        pressure = block.find('pressure')
+        return CurrentConditions(
+            observed_at, utc_offset,
+            block.findtext('station'),
+            block.findtext('condition'),
+            parse_icon(block.findtext('iconCode')),
+            parse_float(block.findtext('temperature')),
+            parse_float(block.findtext('dewpoint')),
+            parse_int(block.findtext('relativeHumidity')),
+            parse_float(pressure.text) if pressure is not None else None,
+            pressure.get('tendency') if pressure is not None else None,
+            block.findtext('wind/direction'),
+            parse_int(block.findtext('wind/speed')),
+            parse_int(block.findtext('wind/gust')),
+        )
 
     def _parse_hourly_forecast(self, root):
-        """Parses the hourly forecast data from the XML tree."""
-        forecasts = []
+        """
+        Parses the hourly forecast data from the XML tree into an HourlyForecast.
+        Numbers are parsed and UTC timestamps converted to local hours once, here.
+        """
+        # The group carries the site's local UTC offset on its non-UTC dateTime
+        utc_offset = 0.0
+        for stamp in root.xpath('//hourlyForecastGroup/dateTime'):
+            if stamp.get('zone') != 'UTC' and stamp.get('UTCOffset'):
+                try:
+                    utc_offset = float(stamp.get('UTCOffset'))
+                except ValueError:
+                    pass
+                break
+
+        hours, temps, pops, icons, conditions = [], [], [], [], []
         # XPath to get each hourly forecast entry
         for entry in root.xpath('//hourlyForecastGroup/hourlyForecast'):
             # dateTimeUTC may be missing or in different formats; guard access
             dt_attr = entry.get('dateTimeUTC') or entry.findtext('dateTimeUTC')
-            hour = ''
-            if dt_attr and len(dt_attr) >= 4:
-                try:
-                    hour = dt_attr[-4:-2]
-                except Exception:
-                    hour = ''
-
-            condition = entry.findtext('condition')
-            icon = entry.findtext('iconCode')
-            temp = entry.findtext('temperature')
+            hours.append(utc_stamp_to_local_hour(dt_attr, utc_offset))
+            temps.append(parse_int(entry.findtext('temperature'), MISSING_TEMP))
             pop = entry.findtext('lop') or entry.findtext('pop')  # try common tags
-            
-            forecasts.append({
-                'hour': hour,
-                'condition': condition,
-                'icon': icon,
-                'temp': temp,
-                'pop': pop if pop else '0' # Default to 0 if PoP is not present
-            })
-        return forecasts
+            pops.append(min(100, max(0, parse_int(pop, 0))))  # Default to 0 if PoP is not present
+            icons.append(parse_icon(entry.findtext('iconCode')))
+            conditions.append(entry.findtext('condition') or "")
+        return HourlyForecast(hours, temps, pops, icons, conditions)
 
     def get_alerts(self):
         """
-        Fetches all active alerts for the configured province.
-        Uses a cache to avoid fetching data too frequently.
+        Returns all active alerts for the configured locations (or province).
+        Uses a cache to avoid fetching data too frequently; as with forecasts,
+        stale alerts are served while the background refresher is running.
         """
-        cache_duration = 300 # 5 minutes
-        if time.time() - self.alert_cache_time < cache_duration and self.alert_cache is not None:
-            logging.info("Using cached alert data.")
-            return self.alert_cache
+        with self._alert_lock:
+            alerts, fetched_at = self.alert_cache, self.alert_cache_time
+        now = time.time()
+        fresh = now - fetched_at < self.ALERT_CACHE_DURATION or self.is_refreshing()
+        announced = self._announced_at.get(self.ALERT_URL)
+        if alerts is not None and fresh and (announced is None or announced > now):
+            logging.debug("Using cached alert data.")
+            return alerts
 
-        xml_data = self._make_request(self.ALERT_URL)
-        if not xml_data:
-            return []
+        self.refresh_alerts()
+        with self._alert_lock:
+            return self.alert_cache if self.alert_cache is not None else []
 
-        root = etree.fromstring(xml_data)
-        # XML Namespace for CAP alerts
-        ns = {'cap': 'urn:oasis:names:tc:emergency:cap:1.2'}
-        
-        alerts = []
-        # Iterate CAP alerts and filter by area description containing the province code.
-        for entry in root.xpath('//cap:alert', namespaces=ns):
-            area_desc = entry.findtext('cap:info/cap:area/cap:areaDesc', namespaces=ns)
-            if not area_desc or self.province_code not in area_desc:
-                continue
+    def refresh_alerts(self):
+        """
+        Downloads the CAP alert feed and ingests it incrementally, replacing the cache.
+        Concurrent refreshes share a single fetch and parse.
+        Returns False (leaving any cached alerts in place) if the fetch fails.
+        """
+        return self._single_flight.do(self.ALERT_URL, self._refresh_alerts)
+
+    def _refresh_alerts(self):
+        shared = self._await_shared(self.ALERT_URL, self._shared_freshness(self.ALERT_URL, self.ALERT_CACHE_DURATION / 2))
+        if shared:
+            if self._shared_seen.get(self.ALERT_URL) == shared.changed_at and self.alert_cache is not None \
+                    and not self._area_matcher_partial:
+                with self._alert_lock:
+                    self.alert_cache_time = time.time()
+                return True
+            # The raw feed is shared; each process applies its own location filter.
+            self._adopt_shared(self.ALERT_URL, shared)
+            return self._ingest_alert_payload(shared.payload)
 
+        try:
+            # While place names could not be resolved, download the feed in full so a
+            # matcher rebuilt once the site list loads sees every alert again
+            xml_data = self._make_request(self.ALERT_URL,
+                                          conditional=self.alert_cache is not None and not self._area_matcher_partial)
+            if xml_data is NOT_MODIFIED:
+                self._touch_shared(self.ALERT_URL)
+                with self._alert_lock:
+                    self.alert_cache_time = time.time()
+                return True
+            if not xml_data:
+                return False
+            self._share(self.ALERT_URL, xml_data)
+        finally:
+            self._release_shared(self.ALERT_URL)
+        return self._ingest_alert_payload(xml_data)
+
+    def _ingest_alert_payload(self, xml_data):
+        from lxml import etree
+
+        generation = self._alert_generation
+        try:
+            with metrics.span('parse_alerts'):
+                index, changes = self._ingest_alerts(xml_data)
+        except etree.XMLSyntaxError as e:
+            logging.error(f"Failed to parse CAP alert feed: {e}")
+            return False
+
+        # Alerts replaced by an Update or withdrawn by a Cancel are no longer active.
+        replaced = set()
+        for _, alert in index.values():
+            if alert and alert['msg_type'] in ('Update', 'Cancel'):
+                replaced.update(alert['references'])
+        alerts = [alert for _, alert in index.values()
+                  if alert and alert['msg_type'] != 'Cancel' and alert['id'] not in replaced]
+
+        # Swap the index, active list and pending changes in together.
+        with self._alert_lock:
+            if generation != self._alert_generation:
+                logging.info("Alert area changed during the refresh; discarding its results.")
+                return False
+            self._alert_index = index
+            self._pending_alert_changes.update((a['id'], a) for a in changes)
+            self.alert_cache = alerts
+            self.alert_cache_time = time.time()
+
+        logging.info(f"Fetched {len(alerts)} alerts for {self._describe_alert_area()} "
+                     f"({len(changes)} new or changed).")
+        if changes:
+            for callback in self.alert_listeners:
+                try:
+                    callback()
+                except Exception as e:
+                    logging.error(f"Alert listener failed: {e}")
+        return True
+
+    def _ingest_alerts(self, xml_data):
+        """
+        Streams the CAP feed with iterparse, clearing each alert as soon as it is
+        read so memory stays flat however large the national feed gets.
+        Alerts whose identifier and version were seen on a previous poll are reused
+        without re-extraction, so polygons are only tested for new alert versions.
+        Returns the new index and the list of new, updated or cancelled alerts.
+        """
+        from lxml import etree
+
+        ns = {'cap': CAP_NS}
+        previous = self._alert_index
+        if self._area_matcher is None or self._area_matcher_partial:
+            was_partial = self._area_matcher is not None
+            self._area_matcher, self._area_matcher_partial = self._build_area_matcher()
+            if was_partial and not self._area_matcher_partial:
+                logging.info("Site list loaded; matching alerts against every ALERT_LOCATIONS entry.")
+                previous = {}  # Re-match alerts kept from the partial matcher
+        index = {}
+        changes = []
+
+        for _, entry in etree.iterparse(io.BytesIO(xml_data), events=('end',), tag=CAP_ALERT_TAG):
             alert_id = entry.findtext('cap:identifier', namespaces=ns)
-            event = entry.findtext('cap:info/cap:event', namespaces=ns)
-            headline = entry.findtext('cap:info/cap:headline', namespaces=ns)
-            description = entry.findtext('cap:info/cap:description', namespaces=ns)
-
-            alerts.append({
-                'id': alert_id,
-                'event': event,
-                'headline': headline,
-                'description': description
-            })
-        
-        logging.info(f"Fetched {len(alerts)} alerts for province {self.province_code}.")
-        self.alert_cache = alerts
-        self.alert_cache_time = time.time()
-        return self.alert_cache
+            version = (entry.findtext('cap:sent', namespaces=ns), entry.findtext('cap:msgType', namespaces=ns))
+
+            known = previous.get(alert_id)
+            if known and known[0] == version:
+                index[alert_id] = known
+            elif alert_id:
+                alert = self._extract_alert(entry, ns)
+                index[alert_id] = (version, alert)
+                if alert:
+                    if alert['msg_type'] == 'Cancel':
+                        alert['change'] = 'cancelled'
+                    elif known or alert['msg_type'] == 'Update':
+                        alert['change'] = 'updated'
+                    else:
+                        alert['change'] = 'new'
+                    changes.append(alert)
+
+            # Free the alert and any already-processed siblings.
+            entry.clear()
+            while entry.getprevious() is not None:
+                del entry.getparent()[0]
+
+        return index, changes
+
+    def _build_area_matcher(self):
+        """
+        Resolves ALERT_LOCATIONS ("lat,lon", site codes or place names) to points.
+        Falls back to province matching if none of them resolve.
+        Returns the matcher and whether it is partial: built while the site list
+        was unavailable, so it should be rebuilt on a later ingest. A partial
+        matcher never falls back to the whole province, since that would
+        broadcast (and permanently record) alerts for places ALERT_LOCATIONS
+        was set to exclude; names that could not be looked up match nothing.
+        """
+        points = {}
+        partial = False
+        for location in self.alert_locations:
+            point = self._resolve_alert_point(str(location))
+            if point:
+                points[point[0]] = point[1:]
+            elif not self.site_list.loaded:
+                partial = True
+            else:
+                logging.warning(f"Ignoring unknown ALERT_LOCATIONS entry '{location}'.")
+        if partial:
+            logging.warning("ECCC site list unavailable; ALERT_LOCATIONS place names will be matched once it loads.")
+        elif self.alert_locations and not points and not self.alert_regions:
+            logging.warning(f"No ALERT_LOCATIONS resolved; matching alerts for all of {self.province_code}.")
+        return AlertAreaMatcher(self.province_code, points, self.alert_regions, province_fallback=not partial), partial
+
+    def _resolve_alert_point(self, location):
+        """Returns (label, lat, lon) for an ALERT_LOCATIONS entry, or None."""
+        lat, _, lon = location.partition(',')
+        try:
+            return location, float(lat), float(lon)
+        except ValueError:
+            pass
+        site = self.site_list.resolve(location)
+        if site and site.lat is not None and site.lon is not None:
+            return site.name, site.lat, site.lon
+        return None
+
+    def _describe_alert_area(self):
+        matcher = self._area_matcher
+        if matcher is None or matcher.province_only:
+            return f"province {self.province_code}"
+        return f"{len(matcher.index)} locations and {len(matcher.regions)} regions"
+
+    def _extract_alert(self, entry, ns):
+        """Extracts one CAP alert, or returns None if it does not cover our locations."""
+        info = entry.find('cap:info', namespaces=ns)
+        if info is None:
+            return None
+        areas = [(area.findtext('cap:areaDesc', default='', namespaces=ns),
+                  [polygon.text for polygon in area.iterfind('cap:polygon', namespaces=ns)],
+                  [geocode.findtext('cap:value', namespaces=ns) for geocode in area.iterfind('cap:geocode', namespaces=ns)])
+                 for area in info.iterfind('cap:area', namespaces=ns)]
+        locations = self._area_matcher.match(areas)
+        if not locations:
+            return None
+
+        # References are "sender,identifier,sent" triples separated by spaces.
+        references = []
+        for ref in (entry.findtext('cap:references', namespaces=ns) or '').split():
+            parts = ref.split(',')
+            if len(parts) >= 2:
+                references.append(parts[1])
+
+        # 'event' is the bare hazard ("rainfall"); the name says what kind of alert it is.
+        parameters = {param.findtext('cap:valueName', default='', namespaces=ns).rsplit(':', 1)[-1]:
+                      param.findtext('cap:value', default='', namespaces=ns)
+                      for param in info.iterfind('cap:parameter', namespaces=ns)}
+        headline = info.findtext('cap:headline', namespaces=ns)
+        name = (parameters.get('Alert_Name')
+                or re.sub(r'\s+in effect\s*$', '', headline or '', flags=re.IGNORECASE).strip()
+                or " ".join(filter(None, (info.findtext('cap:event', namespaces=ns), parameters.get('Alert_Type')))))
+
+        return {
+            'id': entry.findtext('cap:identifier', namespaces=ns),
+            'sent': entry.findtext('cap:sent', namespaces=ns),
+            'msg_type': entry.findtext('cap:msgType', namespaces=ns) or 'Alert',
+            'references': references,
+            'event': entry.findtext('cap:info/cap:event', namespaces=ns),
+            'name': name or None,
+            'headline': headline,
+            'description': entry.findtext('cap:info/cap:description', namespaces=ns),
+            'expires': entry.findtext('cap:info/cap:expires', namespaces=ns),
+            'locations': sorted(locations),
+            'areas': [desc for desc, _, _ in areas if desc],
+        }
+
+    def find_alert(self, ref):
+        """Returns the alert (active or recently ended) with the given short reference, or None."""
+        ref = ref.strip().lower()
+        with self._alert_lock:
+            alerts = [alert for _, alert in self._alert_index.values() if alert]
+        for alert in alerts:
+            if alert_ref(alert['id']) == ref:
+                return alert
+        return None
 
     def get_new_alerts(self):
         """
-        Checks for alerts and returns only those that haven't been sent before.
+        Returns the alerts that are new, updated or cancelled since the last call
+        and have not been broadcast before. Each has a 'change' key.
         """
-        all_alerts = self.get_alerts()
+        self.get_alerts()  # Refreshes the feed if the cache is due
+        with self._alert_lock:
+            changes = list(self._pending_alert_changes.values())
+            self._pending_alert_changes.clear()
+
+        # Alerts already replaced within this same batch are not worth announcing.
+        superseded = {ref for alert in changes for ref in alert['references']}
         new_alerts = []
-        for alert in all_alerts:
-            if alert['id'] not in self.sent_alert_ids:
+        for alert in changes:
+            if alert['id'] in self.sent_alert_ids or alert['id'] in superseded:
+                continue
+            replaces_sent = self.sent_alert_ids.any_sent(alert['references'])
+            # Only announce a cancellation if we broadcast the alert it withdraws.
+            if alert['change'] == 'cancelled' and not replaces_sent:
+                continue
+            # An update to an alert we never broadcast is news to the mesh.
+            if alert['change'] == 'updated' and not replaces_sent:
+                alert = dict(alert, change='new')
+            if self.sent_alert_ids.claim(alert):
                 new_alerts.append(alert)
-                self.sent_alert_ids.add(alert['id'])
         
         return new_alerts
+
+    # --- Background refresh-ahead ---
+
+    def schedule_refresh(self, scheduler, run_now=True):
+        """
+        Registers jobs on the bot's Scheduler that keep the forecast and alert
+        caches warm. While they are registered, commands are always answered
+        from cache (stale-while-revalidate).
+        ECCC regenerates citypage files shortly after each hour, so forecast
+        refreshes are aligned to FORECAST_REFRESH_OFFSET seconds past the hour,
+        with jitter to avoid every bot hitting the datamart at the same instant.
+        Alerts are renewed slightly ahead of each ALERT_CHECK_INTERVAL.
+        """
+        scheduler.add_job('forecast-refresh', self.refresh_all_forecasts,
+                          next_run=next_hourly(self.forecast_refresh_offset), jitter=self.refresh_jitter,
+                          retry=self.REFRESH_RETRY_DELAY, run_now=run_now)
+        lead = min(self.refresh_jitter, self.alert_refresh_interval / 2)
+        scheduler.add_job('alert-refresh', self.refresh_alerts,
+                          interval=self.alert_refresh_interval - lead, jitter=lead,
+                          retry=self.REFRESH_RETRY_DELAY, run_now=run_now)
+        scheduler.add_job('cache-eviction', self.evict_expired, interval=3600)
+        self._background_refresh = True
+
+    def unschedule_refresh(self, scheduler):
+        """Removes the refresh-ahead jobs; expired caches are then refetched on demand."""
+        scheduler.remove_job('forecast-refresh')
+        scheduler.remove_job('alert-refresh')
+        self._background_refresh = False
+
+    def on_announcement(self, path):
+        """
+        Handles a datamart file-change announcement (a URL or path). A changed
+        citypage file for a site we serve is refetched right away on the fetch
+        pool. A new CAP file from an office serving our province marks the
+        alert feed dirty from next_alert_push on, so get_alerts() refetches it
+        then. Returns 'forecast', 'alerts' (when a new alert refetch was
+        scheduled) or None.
+        """
+        if '/alerts/cap/' in path or '/rss/cap/' in path:
+            return self._on_alert_announcement(path)
+        match = CITYPAGE_FILE.search(path)
+        if match:
+            code = match.group(1)
+            site = self._sites.get(code)
+            if site and self._recently_requested(code) and \
+                    (code == self.default_site.code or code in self.forecast_cache.locations()):
+                logging.info(f"Datamart announced new forecast for {code}; refreshing.")
+                self._announced_at[self._forecast_url(site)] = time.time()
+                self._fetch_forecast(site)
+                return 'forecast'
+        return None
+
+    def _on_alert_announcement(self, path):
+        """
+        Debounces CAP announcements: in storm season every office files new
+        CAP files constantly, and each would otherwise cost a download of the
+        national feed. Announcements arriving while a refetch is pending are
+        folded into it, and refetches are NOTIFY_ALERT_DEBOUNCE seconds apart.
+        """
+        if not cap_file_for_province(path, self.province_code):
+            return None
+        now = time.time()
+        if self.next_alert_push > now:
+            return None  # The pending refetch will pick this file up too
+        self.next_alert_push = max(now, self.next_alert_push + self.alert_push_debounce)
+        self._announced_at[self.ALERT_URL] = self.next_alert_push
+        return 'alerts'
+
+    def is_refreshing(self):
+        """True while background refresh jobs keep the caches warm."""
+        return self._background_refresh
+
+    def evict_expired(self):
+        """Drops expired alert records and forecasts too old to serve."""
+        self.sent_alert_ids.evict()
+        self.forecast_cache.evict_expired()
+        cached = set(self.forecast_cache.locations())
+        for code in [c for c in self._requested_at if c not in cached and not self._recently_requested(c)]:
+            del self._requested_at[code]
+
+    # --- Host-wide shared cache ---
+
+    def _await_shared(self, key, freshness):
+        """
+        With a shared cache, returns the SharedEntry for key if any bot process
+        checked it upstream within `freshness` seconds. Otherwise takes the fetch
+        lease (waiting up to SHARED_WAIT for another holder to finish) and returns
+        None, meaning this process should download it. Without one, returns None.
+        """
+        if not self.shared_cache:
+            return None
+        deadline = time.time() + self.SHARED_WAIT
+        while True:
+            entry = self.shared_cache.get(key)
+            if entry and time.time() - entry.checked_at < freshness:
+                return entry
+            if self.shared_cache.acquire_lease(key) or time.time() >= deadline:
+                return None
+            time.sleep(0.5)
+
+    def _shared_freshness(self, url, default):
+        """
+        How recently a shared copy of url must have been checked to be reused.
+        After a push announcement only copies fetched since then will do.
+        Clears the announcement, since the caller is about to refresh.
+        """
+        announced = self._announced_at.pop(url, None)
+        return default if announced is None else min(default, time.time() - announced)
+
+    def _release_shared(self, key):
+        if self.shared_cache:
+            self.shared_cache.release_lease(key)
+
+    def _share(self, url, payload):
+        """Publishes a freshly downloaded payload (and its validators) to the shared cache."""
+        if self.shared_cache:
+            validator = self.validators.get(url, {})
+            self._shared_seen[url] = self.shared_cache.put(url, payload, validator.get('etag'),
+                                                           validator.get('last_modified'))
+
+    def _touch_shared(self, url):
+        if self.shared_cache:
+            self.shared_cache.touch(url)
+
+    def _adopt_shared(self, url, shared):
+        """Takes over a shared payload's validators, so our next conditional GET matches it."""
+        self._shared_seen[url] = shared.changed_at
+        if shared.etag or shared.last_modified:
+            self.validators[url] = {'etag': shared.etag, 'last_modified': shared.last_modified,
+                                    'size': len(shared.payload)}
+
+    # --- Warm-start snapshot ---
+
+    SNAPSHOT_MAX_ALERT_AGE = 86400
+
+    def save_snapshot(self):
+        """Writes parsed forecasts, alert state and HTTP validators to SNAPSHOT_PATH."""
+        if not self.snapshot_path:
+            return
+        forecasts = {}
+        for code in self.forecast_cache.locations():
+            entry = self.forecast_cache.get(code)
+            site = self._sites.get(code)
+            if entry and site:
+                forecasts[code] = {
+                    'site': [site.code, site.name, site.province, site.lat, site.lon],
+                    'fetched_at': entry.fetched_at,
+                    'requested_at': self._requested_at.get(code, 0),
+                    'daily': entry.daily.to_state(),
+                    'hourly': entry.hourly.to_state(),
+                    'current': entry.current.to_state() if entry.current else None,
+                }
+        with self._alert_lock:
+            alerts = {
+                'fetched_at': self.alert_cache_time,
+                'index': {alert_id: [list(version), alert] for alert_id, (version, alert) in self._alert_index.items()},
+                'active': [alert['id'] for alert in self.alert_cache or []],
+            }
+        state = {'forecasts': forecasts, 'alerts': alerts, 'validators': dict(self.validators),
+                 'observations': self.observations.to_state()}
+        try:
+            size = write_snapshot(self.snapshot_path, state)
+            logging.info(f"Saved snapshot ({len(forecasts)} locations, {size} bytes) to {self.snapshot_path}.")
+        except OSError as e:
+            logging.error(f"Failed to save snapshot to {self.snapshot_path}: {e}")
+
+    def load_snapshot(self):
+        """
+        Restores state saved by save_snapshot so commands can be answered right
+        after a restart. Forecasts too old to serve are skipped; the rest keep
+        their original fetch time, so the background refresh revalidates them
+        (usually with a cheap conditional GET). Malformed parts of a snapshot
+        are logged and skipped, never fatal: the bot just starts colder.
+        """
+        state = read_snapshot(self.snapshot_path)
+        if not isinstance(state, dict):
+            return False
+        now = time.time()
+        try:
+            self.validators.update(state.get('validators') or {})
+            self.observations.load_state(state.get('observations'))
+        except Exception as e:
+            logging.error(f"Ignoring malformed validators or observations in snapshot: {e}")
+
+        restored = []
+        for code, saved in (state.get('forecasts') or {}).items():
+            try:
+                if now - saved['fetched_at'] > self.forecast_cache.max_age:
+                    continue
+                site = self._sites.get(code) or Site(*saved['site'])
+                current = CurrentConditions.from_state(saved.get('current'))
+                daily, hourly = DailyForecast.from_state(saved['daily']), HourlyForecast.from_state(saved['hourly'])
+            except Exception as e:
+                logging.error(f"Skipping malformed snapshot forecast for {code}: {e!r}")
+                continue
+            self._sites.setdefault(code, site)
+            self._requested_at.setdefault(code, saved.get('requested_at', 0))
+            entry = self.forecast_cache.put(code, daily, hourly, saved['fetched_at'],
+                                            current, self.observations.record(code, current))
+            restored.append((site, entry))
+
+        try:
+            self._restore_alerts(state.get('alerts') or {}, now)
+        except Exception as e:
+            logging.error(f"Skipping malformed alert state in snapshot: {e!r}")
+
+        logging.info(f"Restored snapshot: {len(restored)} forecast locations, "
+                     f"{len(self.alert_cache or [])} active alerts.")
+        for site, entry in restored:
+            for callback in self.forecast_listeners:
+                try:
+                    callback(site, entry)
+                except Exception as e:
+                    logging.error(f"Forecast listener failed: {e}")
+        return True
+
+    def _restore_alerts(self, alerts, now):
+        """Restores the alert index and active alerts from a snapshot, if recent enough."""
+        if not alerts.get('fetched_at') or now - alerts['fetched_at'] >= self.SNAPSHOT_MAX_ALERT_AGE:
+            return
+        index = {alert_id: (tuple(version), alert) for alert_id, (version, alert) in alerts['index'].items()}
+        active = set(alerts['active'])
+        cache = [alert for _, alert in index.values() if alert and alert['id'] in active]
+        with self._alert_lock:
+            self._alert_index = index
+            self.alert_cache = cache
+            self.alert_cache_time = alerts['fetched_at']
+
+    def close(self):
+        """Stops background work and releases pooled HTTP connections."""
+        self._background_refresh = False
+        self._fetch_pool.shutdown(wait=False, cancel_futures=True)
+        if self._session is not None:
+            self._session.close()
+        self.sent_alert_ids.close()
+        if self.shared_cache:
+            self.shared_cache.close()
@@ -0,0 +1,113 @@
+import itertools
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+def estimate_size(obj):
+    """Approximate deep memory footprint of parsed forecast data, in bytes."""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(estimate_size(item) for item in obj)
+    elif hasattr(type(obj), '__slots__'):
+        size += sum(estimate_size(getattr(obj, name)) for name in type(obj).__slots__)
+    return size
+
+
+_versions = itertools.count(1)
+
+
+class CachedForecast:
+    """
+    Parsed daily and hourly forecasts for one ECCC site, with its current
+    conditions and the observation trends computed when they were stored.
+    The version changes whenever new data is parsed (not when a 304 extends it),
+    so it can key anything derived from the forecast.
+    """
+    __slots__ = ('daily', 'hourly', 'current', 'trends', 'version', 'fetched_at', 'size')
+
+    def __init__(self, daily, hourly, fetched_at=None, current=None, trends=()):
+        self.daily = daily
+        self.hourly = hourly
+        self.current = current
+        self.trends = trends
+        self.version = next(_versions)
+        self.fetched_at = fetched_at or time.time()
+        self.size = estimate_size(daily) + estimate_size(hourly) + estimate_size(current)
+
+    def age(self):
+        return time.time() - self.fetched_at
+
+
+class ForecastCache:
+    """
+    Location-keyed LRU cache of parsed citypage forecasts.
+    Entries are evicted least-recently-used first once the total estimated size
+    goes over max_bytes, and dropped entirely once older than max_age.
+    """
+
+    def __init__(self, max_bytes=2_000_000, max_age=6 * 3600):
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._entries = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def get(self, location):
+        """Returns the CachedForecast for a location (however old), or None."""
+        with self._lock:
+            entry = self._entries.get(location)
+            if entry is None:
+                return None
+            if entry.age() > self.max_age:
+                self._remove(location)
+                return None
+            self._entries.move_to_end(location)
+            return entry
+
+    def put(self, location, daily, hourly, fetched_at=None, current=None, trends=()):
+        """
+        Stores freshly parsed data for a location, evicting LRU entries if needed.
+        fetched_at is only given when restoring older data, e.g. from a snapshot.
+        """
+        entry = CachedForecast(daily, hourly, fetched_at, current, trends)
+        with self._lock:
+            if location in self._entries:
+                self._remove(location)
+            self._entries[location] = entry
+            self._total += entry.size
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                self._remove(next(iter(self._entries)))
+        return entry
+
+    def touch(self, location):
+        """Marks a location's data as fresh without replacing it (e.g. after a 304)."""
+        with self._lock:
+            entry = self._entries.get(location)
+            if entry:
+                entry.fetched_at = time.time()
+            return entry
+
+    def evict_expired(self):
+        """Drops every entry older than max_age."""
+        with self._lock:
+            for location in [loc for loc, e in self._entries.items() if e.age() > self.max_age]:
+                self._remove(location)
+
+    def locations(self):
+        """Cached location codes, least recently used first."""
+        with self._lock:
+            return list(self._entries)
+
+    def total_bytes(self):
+        return self._total
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, location):
+        entry = self._entries.pop(location)
+        self._total -= entry.size
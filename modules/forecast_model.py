@@ -0,0 +1,175 @@
+from array import array
+from datetime import datetime, timedelta, timezone
+
+MISSING_TEMP = -32768  # Sentinel in HourlyForecast.temps for a missing reading
+
+
+def parse_int(value, default=None):
+    """Parses ECCC numeric text such as '5', '-12' or '5.0' into an int."""
+    if value is None:
+        return default
+    try:
+        return int(round(float(value)))
+    except ValueError:
+        return default
+
+
+def parse_float(value, default=None):
+    """Parses ECCC numeric text such as '100.9' into a float."""
+    if value is None:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return default
+
+
+def parse_icon(value):
+    """Normalizes an ECCC icon code to a two-character string once, at parse time."""
+    return value.strip().zfill(2) if value else ""
+
+
+class DailyPeriod:
+    """One named period of the daily forecast, e.g. 'Monday' or 'Monday night'."""
+    __slots__ = ('name', 'abbr', 'icon', 'temp', 'summary', 'is_night')
+
+    def __init__(self, name, icon, temp, summary):
+        self.name = name or ""
+        # Abbreviated period name (e.g., "Monday" -> "Mon")
+        self.abbr = self.name.split()[0][:3] if self.name else ""
+        self.icon = icon
+        self.temp = temp
+        self.summary = summary or ""
+        self.is_night = "night" in self.name.lower()
+
+    def __repr__(self):
+        return f"DailyPeriod({self.name!r}, {self.temp!r})"
+
+
+class DailyForecast:
+    """
+    Immutable daily forecast. Day/night pairing is done once at parse time:
+    `days` holds (day, night) tuples, where night may be None.
+    A leading 'Tonight' period with no day is kept in `periods` only.
+    """
+    __slots__ = ('periods', 'days')
+
+    def __init__(self, periods):
+        self.periods = tuple(periods)
+        days = []
+        seen = set()
+        for period in self.periods:
+            if period.is_night:
+                if days and days[-1][1] is None:
+                    days[-1] = (days[-1][0], period)
+            elif period.name not in seen:
+                seen.add(period.name)
+                days.append((period, None))
+        self.days = tuple(days)
+
+    def __len__(self):
+        return len(self.periods)
+
+    def to_state(self):
+        """Plain, JSON-friendly form for snapshots."""
+        return [[p.name, p.icon, p.temp, p.summary] for p in self.periods]
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(DailyPeriod(*fields) for fields in state)
+
+    def __bool__(self):
+        return bool(self.periods)
+
+
+class HourlyForecast:
+    """
+    Immutable hourly forecast stored as compact column arrays.
+    Hours are local to the forecast site, converted once at parse time.
+    """
+    __slots__ = ('hours', 'temps', 'pops', 'icons', 'conditions')
+
+    def __init__(self, hours, temps, pops, icons, conditions):
+        self.hours = array('b', hours)
+        self.temps = array('h', temps)
+        self.pops = array('B', pops)
+        self.icons = tuple(icons)
+        self.conditions = tuple(conditions)
+
+    def __len__(self):
+        return len(self.hours)
+
+    def to_state(self):
+        """Plain, JSON-friendly form for snapshots."""
+        return {'hours': self.hours.tolist(), 'temps': self.temps.tolist(), 'pops': self.pops.tolist(),
+                'icons': list(self.icons), 'conditions': list(self.conditions)}
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(state['hours'], state['temps'], state['pops'], state['icons'], state['conditions'])
+
+    def __bool__(self):
+        return len(self.hours) > 0
+
+
+class CurrentConditions:
+    """
+    The latest observation from a citypage's currentConditions block.
+    Readings the station did not report are None.
+    """
+    __slots__ = ('observed_at', 'utc_offset', 'station', 'condition', 'icon', 'temp', 'dewpoint',
+                 'humidity', 'pressure', 'tendency', 'wind_dir', 'wind_speed', 'wind_gust')
+
+    def __init__(self, observed_at, utc_offset, station, condition, icon, temp, dewpoint,
+                 humidity, pressure, tendency, wind_dir, wind_speed, wind_gust):
+        self.observed_at = observed_at  # UTC epoch seconds
+        self.utc_offset = utc_offset  # Site's local offset in hours
+        self.station = station or ""
+        self.condition = condition or ""
+        self.icon = icon
+        self.temp = temp
+        self.dewpoint = dewpoint
+        self.humidity = humidity
+        self.pressure = pressure  # kPa
+        self.tendency = tendency or ""
+        self.wind_dir = wind_dir or ""
+        self.wind_speed = wind_speed
+        self.wind_gust = wind_gust
+
+    def local_time(self):
+        """Observation time as 'HH:MM' local to the site."""
+        moment = datetime.fromtimestamp(self.observed_at, timezone.utc) + timedelta(hours=self.utc_offset)
+        return moment.strftime("%H:%M")
+
+    def to_state(self):
+        """Plain, JSON-friendly form for snapshots."""
+        return [getattr(self, name) for name in self.__slots__]
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(*state) if state else None
+
+
+def utc_stamp_to_epoch(stamp):
+    """Converts an ECCC 'YYYYMMDDHHMM...' UTC timestamp to epoch seconds, or None."""
+    if not stamp or len(stamp) < 12:
+        return None
+    try:
+        moment = datetime.strptime(stamp[:12], "%Y%m%d%H%M")
+    except ValueError:
+        return None
+    return moment.replace(tzinfo=timezone.utc).timestamp()
+
+
+def utc_stamp_to_local_hour(stamp, utc_offset_hours):
+    """
+    Converts an ECCC 'YYYYMMDDHHMM' UTC timestamp to the site's local hour (0-23).
+    Returns -1 if the stamp cannot be parsed.
+    """
+    if not stamp or len(stamp) < 12:
+        return -1
+    try:
+        moment = datetime.strptime(stamp[:12], "%Y%m%d%H%M")
+    except ValueError:
+        return -1
+    return (moment + timedelta(hours=utc_offset_hours)).hour
@@ -1,4 +1,90 @@
+import re
 import textwrap
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from modules.alert_store import alert_ref
+from modules.forecast_model import MISSING_TEMP
+from modules.metrics import metrics
+
+# Settings that change how replies are rendered or packed.
+RENDER_SETTINGS = (
+    'FULL_MENU', 'ENABLE_5DAY_FORECAST', 'ENABLE_7DAY_FORECAST', 'ENABLE_HOURLY_WEATHER',
+    'ALERT_INCLUDE_DESCRIPTION', 'MAX_PAYLOAD_BYTES', 'PART_MARKERS',
+)
+
+
+# Word abbreviations for compact alert broadcasts,
+# e.g. "severe thunderstorm warning" -> "SVR TSTM WRN".
+ALERT_WORD_ABBREVIATIONS = {
+    'warning': 'WRN', 'watch': 'WCH', 'advisory': 'ADV', 'statement': 'STMT', 'special': 'SPL',
+    'weather': 'WX', 'severe': 'SVR', 'thunderstorm': 'TSTM', 'rainfall': 'RAIN', 'snowfall': 'SNOW',
+    'freezing': 'FRZ', 'extreme': 'EXT', 'tornado': 'TOR', 'winter': 'WNTR', 'storm': 'STM',
+    'blizzard': 'BLZD', 'squall': 'SQL', 'squalls': 'SQL', 'surge': 'SRG', 'arctic': 'ARC',
+    'outflow': 'OUTFL', 'quality': 'QUAL', 'blowing': 'BLW', 'hurricane': 'HURR', 'tropical': 'TROP',
+    'drizzle': 'DRZL', 'frost': 'FRST', 'yellow': 'YLW', 'orange': 'ORG',
+}
+ALERT_CHANGE_PREFIXES = {'new': '!!', 'updated': 'UPD', 'cancelled': 'END'}
+
+
+def alert_name(alert):
+    """The alert's name, e.g. "rainfall warning"; older records only carry the bare CAP event."""
+    return alert.get('name') or alert.get('event') or ''
+
+
+def abbreviate_event(event):
+    """Abbreviates a CAP event name word by word; unknown words are upper-cased."""
+    words = re.findall(r"[a-z]+", (event or "").lower())
+    return " ".join(ALERT_WORD_ABBREVIATIONS.get(word, word.upper()) for word in words) or "ALERT"
+
+
+class RenderCache:
+    """
+    Memoizes final packed replies per (command, location).
+    Each slot remembers the forecast version and settings hash it was rendered
+    from, so a new forecast or a settings change simply misses and replaces it.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (command, location) -> (version key, messages)
+        self._lock = threading.Lock()
+
+    def get_or_render(self, command, location, version, settings_hash, render):
+        """Returns cached messages, or calls render() and caches its result."""
+        slot = (command, location)
+        version_key = (version, settings_hash)
+        with self._lock:
+            cached = self._entries.get(slot)
+            if cached and cached[0] == version_key:
+                self.hits += 1
+                self._entries.move_to_end(slot)
+                return cached[1]
+            self.misses += 1
+
+        messages = render()
+        with self._lock:
+            self._entries[slot] = (version_key, messages)
+            self._entries.move_to_end(slot)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return messages
+
+    def invalidate(self, location=None):
+        """Drops cached replies for one location, or all of them."""
+        with self._lock:
+            if location is None:
+                self._entries.clear()
+            else:
+                for slot in [s for s in self._entries if s[1] == location]:
+                    del self._entries[slot]
+
+    def __len__(self):
+        return len(self._entries)
+
 
 class MeshtasticFormatter:
     """
@@ -14,21 +100,85 @@ class MeshtasticFormatter:
         "38": "🌦️", "39": "⛈️", "40": "❄️", "43": "💨", "44": "🌫️",
     }
 
+    # Forecast commands, and the setting (if any) that enables each one.
+    FORECAST_COMMANDS = {
+        "hourly": 'ENABLE_HOURLY_WEATHER', "5day": 'ENABLE_5DAY_FORECAST',
+        "7day": 'ENABLE_7DAY_FORECAST', "4day": None, "2day": None, "rain": None, "temp": None,
+        "now": None, "trend": None,
+    }
+
     def __init__(self, settings):
+        self.apply_settings(settings)
+
+    @staticmethod
+    def render_hash(settings):
+        """Hash of the settings that affect rendered replies."""
+        return hash(tuple(repr(settings.get(key)) for key in RENDER_SETTINGS))
+
+    def apply_settings(self, settings):
+        """
+        Switches to new settings. Returns True if rendering changed, in which
+        case cached replies (keyed by settings_hash) no longer match.
+        """
+        settings_hash = self.render_hash(settings)
+        changed = settings_hash != getattr(self, 'settings_hash', None)
+        # Settings first: anything that sees the new hash also sees the new settings
         self.settings = settings
+        self.settings_hash = settings_hash
+        return changed
+
+    def is_enabled(self, command):
+        """True if a forecast command is enabled in settings."""
+        flag = self.FORECAST_COMMANDS.get(command)
+        return flag is None or bool(self.settings.get(flag))
+
+    def format_forecast_command(self, command, forecast):
+        """Formats the reply for a forecast command from a CachedForecast."""
+        with metrics.span('format', command):
+            return self._format_forecast_command(command, forecast)
+
+    def _format_forecast_command(self, command, forecast):
+        if command == "hourly":
+            return self.format_hourly(forecast.hourly)
+        if command == "5day":
+            return self.format_daily_forecast(forecast.daily, days=5, details=True)
+        if command == "7day":
+            return self.format_daily_forecast(forecast.daily, days=7)
+        if command == "4day":
+            return self.format_daily_forecast(forecast.daily, days=4)
+        if command == "2day":
+            return self.format_daily_forecast(forecast.daily, days=2, details=True)
+        if command == "rain":
+            return self.format_rain(forecast.hourly)
+        if command == "temp":
+            return self.format_temp(forecast.hourly)
+        if command == "now":
+            return self.format_current(forecast.current)
+        if command == "trend":
+            return self.format_trend(forecast.current, forecast.trends)
+        raise ValueError(f"Not a forecast command: {command}")
 
     def get_emoji(self, icon_code):
         """Returns an emoji for a given ECCC weather icon code."""
-        # ECCC icon codes can have leading zeros, ensure it's a 2-char string
-        code_str = str(icon_code).zfill(2)
+        # Parsed icon codes are already 2-char strings; pad anything else
+        code_str = icon_code if isinstance(icon_code, str) and len(icon_code) == 2 else str(icon_code).zfill(2)
         return self.ICON_TO_EMOJI.get(code_str, "❓")
 
+    @staticmethod
+    def _hour_label(hour):
+        return f"{hour:02d}" if hour >= 0 else "??"
+
+    @staticmethod
+    def _temp_label(temp):
+        return "?" if temp is None or temp == MISSING_TEMP else str(temp)
+
     def format_help_menu(self):
         """Generates the help menu text."""
         menu = "Akita WeatherBot Menu:\n"
         menu += "? - This menu\n"
         menu += "test, tst-detail\n"
         menu += "alert-status, advertise\n"
+        menu += "alert <id> - Alert details\n"
 
         if self.settings.get('FULL_MENU'):
             if self.settings.get('ENABLE_5DAY_FORECAST'):
@@ -40,9 +190,38 @@ class MeshtasticFormatter:
         
         menu += "4day - 4 day simple forecast\n"
         menu += "2day - Today & Tomorrow\n"
-        menu += "rain, temp - 24hr forecasts"
+        menu += "rain, temp - 24hr forecasts\n"
+        menu += "now, trend - Observed & 12/24hr trend"
         return menu
     
+    def format_stats(self, metrics):
+        """Formats a compact health summary for the 'stats' admin command."""
+        gauges = metrics.read_gauges()
+        uptime = int(time.time() - metrics.started_at)
+        commands = metrics.merged('command')
+        sent = metrics.counters.get('packets_sent', 0)
+        airtime = metrics.counters.get('airtime_seconds', 0.0)
+        lines = [
+            f"Up {uptime // 3600}h{uptime % 3600 // 60:02d}m",
+            f"Cmd {commands.count} p50<{commands.percentile(0.5) * 1000:.0f}ms "
+            f"p95<{commands.percentile(0.95) * 1000:.0f}ms shed {gauges.get('commands_shed', 0)}",
+            f"HTTP {gauges.get('http_requests', 0)} ({gauges.get('http_not_modified', 0)}x304) "
+            f"{gauges.get('http_bytes_downloaded', 0) / 1e6:.1f}MB",
+            f"Render hit {gauges.get('render_cache_hit_ratio', 0.0) * 100:.0f}%",
+            f"TX {sent} pkts {airtime:.0f}s air, q {gauges.get('outbound_queue_depth', 0)}",
+        ]
+        if 'fanout_shared' in metrics.counters:
+            lines.append(f"Shared {metrics.counters['fanout_shared']} replies, "
+                         f"saved {metrics.counters.get('fanout_airtime_saved_seconds', 0.0):.0f}s air")
+        return "\n".join(lines)
+
+    @staticmethod
+    def format_fanout_pointer(label, age, broadcast=False):
+        """Short reply for a node asking again for a reply it was just sent."""
+        when = f"{age}s" if age < 120 else f"{age // 60}m"
+        where = " on the channel" if broadcast else ""
+        return f"'{label}' was sent{where} {when} ago; no change since."
+
     def format_test_detail(self, packet):
         """Formats the detailed test response."""
         rssi = packet.get('rssi', 'N/A')
@@ -51,56 +230,41 @@ class MeshtasticFormatter:
         return f"ACK! RSSI:{rssi} SNR:{snr} Hops:{hops}"
 
     def format_daily_forecast(self, forecast_data, days=5, details=False):
-        """Formats a daily forecast. Can be simple (emoji) or detailed."""
+        """Formats a DailyForecast. Can be simple (emoji) or detailed."""
         if not forecast_data:
             return f"Could not retrieve {days}-day forecast."
 
         output = []
-        # ECCC data has day/night separated. We iterate to find unique day periods.
-        day_periods = []
-        for entry in forecast_data:
-            if "night" not in entry['period'].lower() and entry['period'] not in day_periods:
-                day_periods.append(entry['period'])
-            if len(day_periods) >= days:
-                break
+        # Day/night pairs are precomputed by the parser; only day periods are shown.
+        day_periods = [day for day, _ in forecast_data.days[:days]]
         
         if details:
             # Multi-line, detailed format
-            for period_name in day_periods:
-                # Find the matching entry
-                day_entry = next((e for e in forecast_data if e['period'] == period_name), None)
-                if day_entry:
-                    emoji = self.get_emoji(day_entry['icon'])
-                    temp = day_entry['temp']
-                    summary = day_entry['summary']
-                    output.append(f"{period_name}: {emoji} {temp}°C\n{summary}")
+            for period in day_periods:
+                emoji = self.get_emoji(period.icon)
+                output.append(f"{period.name}: {emoji} {self._temp_label(period.temp)}°C\n{period.summary}")
             return "\n\n".join(output)
         else:
             # Single-line, emoji-only format
-            for period_name in day_periods:
-                day_entry = next((e for e in forecast_data if e['period'] == period_name), None)
-                if day_entry:
-                    # Abbreviate period name (e.g., "Monday" -> "Mon")
-                    period_abbr = period_name.split()[0][:3]
-                    emoji = self.get_emoji(day_entry['icon'])
-                    temp = day_entry['temp']
-                    output.append(f"{period_abbr}:{emoji}{temp}°")
+            for period in day_periods:
+                emoji = self.get_emoji(period.icon)
+                output.append(f"{period.abbr}:{emoji}{self._temp_label(period.temp)}°")
             return f"{days}-Day: " + " ".join(output)
 
     def format_hourly(self, hourly_data):
-        """Formats the 24-hour forecast into a multi-message string."""
+        """Formats the 24-hour forecast (local hours) into a multi-message string."""
         if not hourly_data:
             return "Could not retrieve hourly forecast."
         
         # Group into chunks of 6 hours for readability; base on available data (cap at 24)
         count = min(len(hourly_data), 24)
-        chunks = [hourly_data[i:i + 6] for i in range(0, count, 6)]
         output_parts = []
-        for chunk in chunks:
+        for start in range(0, count, 6):
             part = []
-            for entry in chunk:
-                emoji = self.get_emoji(entry.get('icon'))
-                part.append(f"{entry.get('hour')}h:{entry.get('temp')}° {entry.get('pop')}% {emoji}")
+            for i in range(start, min(start + 6, count)):
+                emoji = self.get_emoji(hourly_data.icons[i])
+                part.append(f"{self._hour_label(hourly_data.hours[i])}h:{self._temp_label(hourly_data.temps[i])}° "
+                            f"{hourly_data.pops[i]}% {emoji}")
             output_parts.append("\n".join(part))
         return "\n\n".join(output_parts)
 
@@ -110,7 +274,8 @@ class MeshtasticFormatter:
             return "Could not retrieve rain forecast."
         
         # Creates a string like "13h:10% 14h:15% 15h:20%..."
-        parts = [f"{entry['hour']}h:{entry['pop']}%" for entry in hourly_data[:24]]
+        parts = [f"{self._hour_label(hour)}h:{pop}%"
+                 for hour, pop in zip(hourly_data.hours[:24], hourly_data.pops[:24])]
         return "24hr POP: " + " ".join(parts)
 
     def format_temp(self, hourly_data):
@@ -119,19 +284,125 @@ class MeshtasticFormatter:
             return "Could not retrieve temperature forecast."
             
         # Creates a string like "13h:15C 14h:14C 15h:13C..."
-        parts = [f"{entry['hour']}h:{entry['temp']}C" for entry in hourly_data[:24]]
+        parts = [f"{self._hour_label(hour)}h:{self._temp_label(temp)}C"
+                 for hour, temp in zip(hourly_data.hours[:24], hourly_data.temps[:24])]
         return "24hr Temp: " + " ".join(parts)
 
+    @staticmethod
+    def _signed(value, digits=1):
+        return "?" if value is None else f"{value:+.{digits}f}"
+
+    def format_current(self, current):
+        """Formats the latest observation for the 'now' command."""
+        if not current:
+            return "No current conditions reported for this location."
+        lines = [f"Now {current.local_time()}: {self.get_emoji(current.icon)} {current.condition}".rstrip()]
+        reading = f"{current.temp:.1f}C" if current.temp is not None else "?C"
+        if current.humidity is not None:
+            reading += f" RH {current.humidity}%"
+        if current.dewpoint is not None:
+            reading += f" Dew {current.dewpoint:.1f}"
+        lines.append(reading)
+        if current.wind_speed is not None:
+            wind = f"Wind {current.wind_dir} {current.wind_speed}".replace("  ", " ")
+            if current.wind_gust:
+                wind += f" G{current.wind_gust}"
+            lines.append(wind + " km/h")
+        if current.pressure is not None:
+            lines.append(f"{current.pressure:.1f} kPa {current.tendency}".rstrip())
+        return "\n".join(lines)
+
+    def format_trend(self, current, trends):
+        """
+        Formats temperature and pressure changes for the 'trend' command from
+        the observation history, e.g. "12h: T +2.3 (4.8..7.1) P -0.8".
+        """
+        if not current:
+            return "No current conditions reported for this location."
+        temp = f"{current.temp:.1f}C" if current.temp is not None else "?C"
+        pressure = f" {current.pressure:.1f}kPa" if current.pressure is not None else ""
+        lines = [f"Trend to {current.local_time()}: {temp}{pressure}"]
+        for trend in trends:
+            if trend is None:
+                continue
+            line = f"{trend.hours}h: T {self._signed(trend.temp_change)}"
+            if trend.temp_low is not None:
+                line += f" ({trend.temp_low:.1f}..{trend.temp_high:.1f})"
+            if trend.pressure_change is not None:
+                line += f" P {self._signed(trend.pressure_change, 2)}"
+            lines.append(line)
+        if len(lines) == 1:
+            lines.append("Not enough history yet for 12/24h trends.")
+            if current.tendency:
+                # ECCC's own pressure tendency (over the last 3 hours) is still useful
+                lines.append(f"Pressure {current.tendency}")
+        return "\n".join(lines)
+
     def format_alert(self, alert):
-        """Formats a weather alert for broadcast."""
-        output = f"!! WEATHER ALERT !!\n"
+        """Formats a weather alert (new, updated or cancelled) for broadcast."""
+        change = alert.get('change', 'new')
+        if change == 'cancelled':
+            return f"-- ALERT ENDED --\nEvent: {alert_name(alert)[:40]}"
+
+        output = "!! ALERT UPDATED !!\n" if change == 'updated' else "!! WEATHER ALERT !!\n"
         # Truncate long event names
-        output += f"Event: {alert['event'][:40]}\n"
+        output += f"Event: {alert_name(alert)[:40]}\n"
         output += f"Headline: {alert['headline']}"
 
-        if self.settings.get('ALERT_INCLUDE_DESCRIPTION'):
+        if self.settings.get('ALERT_INCLUDE_DESCRIPTION') and alert.get('description'):
             # Wrap the description to avoid overly long lines
             wrapped_desc = textwrap.fill(alert['description'], width=35)
             output += f"\n\nDetails:\n{wrapped_desc}"
 
         return output
+
+    def format_alert_batch(self, alerts):
+        """
+        Formats several alerts as one compact broadcast: alerts are grouped by
+        change and alert name (so watches and warnings stay apart), one line per group, each area tagged with the short
+        reference used by the 'alert <id>' command.
+        """
+        groups = OrderedDict()
+        for alert in alerts:
+            change = alert.get('change', 'new')
+            groups.setdefault((change, abbreviate_event(alert_name(alert))), []).append(alert)
+
+        lines = []
+        for (change, event), group in groups.items():
+            # Alerts for the same area share one label: "Kingston [ab12,cd34]"
+            refs_by_area = OrderedDict()
+            for alert in group:
+                areas = alert.get('areas') or alert.get('locations') or ["?"]
+                area = areas[0][:24] + (f"+{len(areas) - 1}" if len(areas) > 1 else "")
+                refs_by_area.setdefault(area, []).append(alert_ref(alert['id']))
+            items = [f"{area} [{','.join(refs)}]" for area, refs in refs_by_area.items()]
+            lines.append(f"{ALERT_CHANGE_PREFIXES.get(change, '!!')} {event}: " + "; ".join(items))
+        lines.append("Send 'alert <id>' for details")
+        return "\n".join(lines)
+
+    def format_alert_details(self, alert):
+        """Formats the full details of one alert for the 'alert <id>' command."""
+        header = f"{abbreviate_event(alert_name(alert))} [{alert_ref(alert['id'])}]"
+        if alert.get('change') == 'cancelled' or alert.get('msg_type') == 'Cancel':
+            return f"{header} ended.\n{alert['headline'] or alert_name(alert)}"
+
+        lines = [header, alert['headline'] or alert_name(alert)]
+        if alert.get('areas'):
+            lines.append("Areas: " + "; ".join(alert['areas']))
+        expires = self._short_time(alert.get('expires'))
+        if expires:
+            lines.append(f"Until: {expires}")
+        output = "\n".join(lines)
+        if alert.get('description'):
+            output += "\n\n" + textwrap.fill(alert['description'], width=35)
+        return output
+
+    @staticmethod
+    def _short_time(value):
+        """'2025-10-16T18:00:00-04:00' -> 'Thu 18:00' (in the alert's own offset)."""
+        if not value:
+            return None
+        try:
+            return datetime.fromisoformat(value).strftime("%a %H:%M")
+        except ValueError:
+            return None
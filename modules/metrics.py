@@ -0,0 +1,154 @@
+import bisect
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _number(value):
+    return f"{value:.3f}" if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; cheap to update, percentiles are bucket upper bounds."""
+    __slots__ = ('counts', 'count', 'total')
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of observations."""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float('inf')
+
+
+class Metrics:
+    """
+    Process-wide counters, latency histograms and gauges.
+    Spans time a block of code into a histogram; gauges are callables read
+    when the metrics are rendered, so existing stats dicts need no copying.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.counters = {}
+        self.histograms = {}  # (name, label) -> Histogram
+        self.gauges = {}  # name -> callable returning a number
+        self._lock = threading.Lock()
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name, seconds, label=None):
+        with self._lock:
+            histogram = self.histograms.get((name, label))
+            if histogram is None:
+                histogram = self.histograms[(name, label)] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def span(self, name, label=None):
+        """Times the enclosed block into the `name` histogram."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, label)
+
+    def register_gauge(self, name, func):
+        self.gauges[name] = func
+
+    def merged(self, name):
+        """One histogram combining every label of `name`."""
+        merged = Histogram()
+        with self._lock:
+            for (hist_name, _), histogram in self.histograms.items():
+                if hist_name == name:
+                    merged.counts = [a + b for a, b in zip(merged.counts, histogram.counts)]
+                    merged.count += histogram.count
+                    merged.total += histogram.total
+        return merged
+
+    def read_gauges(self):
+        values = {}
+        for name, func in list(self.gauges.items()):
+            try:
+                values[name] = func()
+            except Exception as e:
+                logging.debug(f"Gauge {name} failed: {e}")
+        return values
+
+    def render_prometheus(self):
+        """Renders all metrics in the Prometheus text exposition format."""
+        lines = [f"akitabot_uptime_seconds {time.time() - self.started_at:.0f}"]
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = {key: (list(h.counts), h.count, h.total) for key, h in self.histograms.items()}
+        for name, value in sorted(counters.items()):
+            lines.append(f"akitabot_{name}_total {_number(value)}")
+        for name, value in sorted(self.read_gauges().items()):
+            lines.append(f"akitabot_{name} {_number(value)}")
+        for (name, label), (counts, count, total) in sorted(histograms.items(), key=lambda item: (item[0][0], item[0][1] or "")):
+            labels = f'command="{label}",' if label else ""
+            cumulative = 0
+            for bound, bucket in zip(LATENCY_BUCKETS, counts):
+                cumulative += bucket
+                lines.append(f'akitabot_{name}_seconds_bucket{{{labels}le="{bound}"}} {cumulative}')
+            lines.append(f'akitabot_{name}_seconds_bucket{{{labels}le="+Inf"}} {count}')
+            suffix = f"{{{labels.rstrip(',')}}}" if labels else ""
+            lines.append(f"akitabot_{name}_seconds_sum{suffix} {total:.6f}")
+            lines.append(f"akitabot_{name}_seconds_count{suffix} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write_file(self, path):
+        """Atomically writes the Prometheus text to path (e.g. for node_exporter's textfile collector)."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+    def serve(self, port, host='127.0.0.1'):
+        """Serves the metrics over HTTP on a local port from a daemon thread."""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), _Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        logging.info(f"Serving metrics on http://{host}:{port}/metrics")
+        return server
+
+
+# Shared registry for the whole process.
+metrics = Metrics()
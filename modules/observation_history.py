@@ -0,0 +1,147 @@
+import math
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+# Spans reported by the 'trend' command, in hours.
+TREND_HOURS = (12, 24)
+
+# How far the oldest reading may be from the exact start of a trend span, in
+# seconds. ECCC observations are hourly, but a missed refresh leaves gaps.
+TREND_TOLERANCE = 5400
+
+
+def _value(number):
+    return math.nan if number is None else float(number)
+
+
+class Trend:
+    """Change in temperature and pressure over a span, with the temperature range."""
+    __slots__ = ('hours', 'temp_change', 'temp_low', 'temp_high', 'pressure_change')
+
+    def __init__(self, hours, temp_change, temp_low, temp_high, pressure_change):
+        self.hours = hours
+        self.temp_change = temp_change
+        self.temp_low = temp_low
+        self.temp_high = temp_high
+        self.pressure_change = pressure_change
+
+    def __repr__(self):
+        return f"Trend({self.hours}h, T {self.temp_change!r}, P {self.pressure_change!r})"
+
+
+class ObservationRing:
+    """
+    Fixed-size ring buffer of one site's observations: parallel 'd' arrays of
+    UTC time, temperature and pressure, allocated once. Missing readings are NaN.
+    """
+    __slots__ = ('capacity', 'times', 'temps', 'pressures', '_next', '_count')
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.times = array('d', [0.0]) * capacity
+        self.temps = array('d', [math.nan]) * capacity
+        self.pressures = array('d', [math.nan]) * capacity
+        self._next = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, observed_at, temp, pressure):
+        """Adds a reading, overwriting the oldest when full. Readings not newer than the last are ignored."""
+        if self._count and observed_at <= self.times[self._next - 1]:
+            return False
+        i = self._next
+        self.times[i] = observed_at
+        self.temps[i] = _value(temp)
+        self.pressures[i] = _value(pressure)
+        self._next = (i + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+        return True
+
+    def _ordered(self, column):
+        """A column's readings oldest first: one or two slice copies, no per-item Python work."""
+        if self._count < self.capacity:
+            return column[:self._count]
+        return column[self._next:] + column[:self._next]
+
+    def trend(self, hours):
+        """
+        The Trend over the last `hours` up to the latest reading, or None if
+        the buffer does not reach back that far yet.
+        """
+        times = self._ordered(self.times)
+        if not times:
+            return None
+        start = times[-1] - hours * 3600
+        first = bisect_left(times, start - TREND_TOLERANCE)
+        if first >= len(times) or times[first] > start + TREND_TOLERANCE:
+            return None
+        temps = self._ordered(self.temps)[first:]
+        pressures = self._ordered(self.pressures)[first:]
+        readings = [t for t in temps if not math.isnan(t)]
+        return Trend(
+            hours,
+            _change(temps),
+            min(readings) if readings else None,
+            max(readings) if readings else None,
+            _change(pressures),
+        )
+
+    def to_state(self):
+        """Plain, JSON-friendly form for snapshots (NaN becomes None)."""
+        return [[t, None if math.isnan(c) else c, None if math.isnan(p) else p]
+                for t, c, p in zip(self._ordered(self.times), self._ordered(self.temps),
+                                   self._ordered(self.pressures))]
+
+    @classmethod
+    def from_state(cls, capacity, state):
+        ring = cls(capacity)
+        for observed_at, temp, pressure in state[-capacity:]:
+            ring.append(observed_at, temp, pressure)
+        return ring
+
+
+def _change(values):
+    """Latest minus oldest reading of a window, or None if either is missing."""
+    change = values[-1] - values[0]
+    return None if math.isnan(change) else change
+
+
+class ObservationHistory:
+    """
+    Observation ring buffers per location, fed by every parsed citypage so
+    trends cost no extra downloads. Least recently updated locations are
+    dropped beyond max_locations.
+    """
+
+    def __init__(self, capacity=72, max_locations=64):
+        self.capacity = max(2, capacity)
+        self.max_locations = max_locations
+        self._rings = OrderedDict()  # location -> ObservationRing
+        self._lock = threading.Lock()
+
+    def record(self, location, current):
+        """
+        Appends a CurrentConditions reading and returns the trends over
+        TREND_HOURS (None where there is not enough history yet).
+        """
+        with self._lock:
+            ring = self._rings.pop(location, None) or ObservationRing(self.capacity)
+            self._rings[location] = ring
+            while len(self._rings) > self.max_locations:
+                self._rings.popitem(last=False)
+            if current and current.observed_at:
+                ring.append(current.observed_at, current.temp, current.pressure)
+            return tuple(ring.trend(hours) for hours in TREND_HOURS)
+
+    def to_state(self):
+        with self._lock:
+            return {location: ring.to_state() for location, ring in self._rings.items()}
+
+    def load_state(self, state):
+        with self._lock:
+            for location, readings in (state or {}).items():
+                self._rings[location] = ObservationRing.from_state(self.capacity, readings)
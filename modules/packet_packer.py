@@ -0,0 +1,139 @@
+import unicodedata
+
+# Penalties for where a packet boundary falls. The packer always uses the
+# fewest packets possible and, among equally short packings, prefers cuts at
+# record boundaries over lines, lines over words, and words over characters.
+_BREAK_RECORD = 0
+_BREAK_LINE = 1
+_BREAK_WORD = 4
+_BREAK_CHAR = 16
+
+_JOINERS = {'‍'}
+_MODIFIERS = {'︎', '️'}
+
+
+def _clusters(text):
+    """
+    Splits text into user-perceived characters so a cut never lands inside an
+    emoji (variation selectors, ZWJ sequences, skin tones, combining marks).
+    """
+    clusters = []
+    join_next = False
+    for ch in text:
+        attach = (
+            join_next
+            or ch in _MODIFIERS
+            or ch in _JOINERS
+            or 0x1F3FB <= ord(ch) <= 0x1F3FF
+            or unicodedata.combining(ch)
+        )
+        if clusters and attach:
+            clusters[-1] += ch
+        else:
+            clusters.append(ch)
+        join_next = ch in _JOINERS
+    return clusters
+
+
+class PacketPacker:
+    """
+    Packs formatter output into as few radio packets as possible.
+    Sizes are measured in encoded UTF-8 bytes against MAX_PAYLOAD_BYTES, and
+    packets only break on record ("\\n\\n") or line boundaries unless a single
+    line is itself too long for one packet.
+    """
+
+    def __init__(self, settings):
+        self.max_bytes = settings.get('MAX_PAYLOAD_BYTES', 200)
+        self.part_markers = settings.get('PART_MARKERS', False)
+
+    def pack(self, text):
+        """Returns a list of packet strings for the given reply text."""
+        if not text:
+            return []
+        tokens = self._tokenize(text, self.max_bytes)
+        packets = self._pack_tokens(tokens, self.max_bytes)
+        if not self.part_markers or len(packets) < 2:
+            return packets
+
+        # Reserve room for the "k/n " prefix, repeating if n gains a digit.
+        total = len(packets)
+        while True:
+            reserve = len(f"{total}/{total} ".encode('utf-8'))
+            limit = self.max_bytes - reserve
+            packets = self._pack_tokens(self._tokenize(text, limit), limit)
+            if len(packets) <= total:
+                break
+            total = len(packets)
+        total = len(packets)
+        return [f"{i}/{total} {p}" for i, p in enumerate(packets, 1)]
+
+    def _tokenize(self, text, limit):
+        """
+        Breaks text into (piece, separator_before, penalty_before) tokens.
+        Lines that fit within the limit are kept whole.
+        """
+        tokens = []
+        for r, record in enumerate(text.split("\n\n")):
+            for l, line in enumerate(record.split("\n")):
+                if r == 0 and l == 0:
+                    sep, penalty = "", _BREAK_RECORD
+                elif l == 0:
+                    sep, penalty = "\n\n", _BREAK_RECORD
+                else:
+                    sep, penalty = "\n", _BREAK_LINE
+
+                if len(line.encode('utf-8')) <= limit:
+                    tokens.append((line, sep, penalty))
+                    continue
+                for w, word in enumerate(line.split(" ")):
+                    word_sep, word_penalty = (sep, penalty) if w == 0 else (" ", _BREAK_WORD)
+                    if len(word.encode('utf-8')) <= limit:
+                        tokens.append((word, word_sep, word_penalty))
+                        continue
+                    for c, cluster in enumerate(_clusters(word)):
+                        if c == 0:
+                            tokens.append((cluster, word_sep, word_penalty))
+                        else:
+                            tokens.append((cluster, "", _BREAK_CHAR))
+        return tokens
+
+    @staticmethod
+    def _pack_tokens(tokens, limit):
+        """
+        Chooses packet boundaries by dynamic programming, minimising first the
+        packet count and then the total break penalty.
+        """
+        n = len(tokens)
+        sizes = [len(t[0].encode('utf-8')) for t in tokens]
+        sep_sizes = [len(t[1].encode('utf-8')) for t in tokens]
+        best = [None] * (n + 1)
+        best[0] = (0, 0, 0)  # (packets, penalty, start of last packet)
+        for i in range(1, n + 1):
+            # Grow the last packet backwards from token i-1 while it still fits.
+            size = sizes[i - 1]
+            j = i - 1
+            while True:
+                if best[j] is not None:
+                    penalty = best[j][1] + (tokens[j][2] if j > 0 else 0)
+                    candidate = (best[j][0] + 1, penalty, j)
+                    if best[i] is None or candidate[:2] < best[i][:2]:
+                        best[i] = candidate
+                if j == 0:
+                    break
+                size += sizes[j - 1] + sep_sizes[j]
+                if size > limit:
+                    break
+                j -= 1
+
+        packets = []
+        i = n
+        while i > 0:
+            j = best[i][2]
+            parts = [tokens[j][0]]
+            for k in range(j + 1, i):
+                parts.append(tokens[k][1] + tokens[k][0])
+            packets.append("".join(parts))
+            i = j
+        packets.reverse()
+        return packets
@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import OrderedDict
+from modules.metrics import metrics
+from modules.transmit_scheduler import PRIORITY_FANOUT, PRIORITY_REPLY
+
+FANOUT_MODES = ('broadcast', 'batch')
+
+
+def _pending(queued):
+    """True if any of the packets is still waiting in the transmit queue."""
+    return any(message.sent_at is None and not message.cancelled for message in queued)
+
+
+def _last_sent(queued):
+    return max((message.sent_at for message in queued if message.sent_at is not None), default=None)
+
+
+class _SharedReply:
+    """One rendered reply and everyone on a radio who asked for it within the window."""
+    __slots__ = ('messages', 'created', 'requesters', 'broadcast')
+
+    def __init__(self, messages, created):
+        self.messages = messages
+        self.created = created
+        self.requesters = {}  # destination -> their queued packets ([] if they share the broadcast)
+        self.broadcast = None  # Queued packets of the channel broadcast, once there is one
+
+
+class ReplyFanout:
+    """
+    Shares one rendered reply between nodes that ask for the same thing on the
+    same radio within REPLY_FANOUT_WINDOW seconds.
+
+    In 'broadcast' mode, once REPLY_FANOUT_MIN requesters are waiting for the
+    same reply, their queued unicasts are withdrawn and replaced by a single
+    channel broadcast, which later requesters join while it is still queued.
+    In 'batch' mode replies stay unicast, but the copies of a shared reply are
+    promoted ahead of other replies so the whole group is answered together.
+    In both modes a node that asks again gets a short "sent Xs ago" pointer
+    instead of the full reply (or nothing, if its copy is still queued).
+    """
+
+    def __init__(self, settings):
+        self._groups = OrderedDict()  # (transmitter, key) -> _SharedReply, oldest first
+        self._lock = threading.Lock()
+        self.apply_settings(settings)
+
+    def apply_settings(self, settings):
+        self.mode = (settings.get('REPLY_FANOUT') or '').lower()
+        self.window = settings.get('REPLY_FANOUT_WINDOW', 300)
+        self.min_requesters = settings.get('REPLY_FANOUT_MIN', 3)
+
+    @property
+    def enabled(self):
+        return self.mode in FANOUT_MODES
+
+    def send(self, transmitter, key, messages, destination, pointer):
+        """
+        Queues a rendered reply for `destination` on `transmitter`, sharing it
+        with other requesters of the same `key` where possible.
+        `pointer(age_seconds, broadcast)` returns the text for a repeat request.
+        """
+        now = time.monotonic()
+        airtime = sum(transmitter.estimate_airtime(text) for text in messages)
+        with self._lock:
+            while self._groups and now - next(iter(self._groups.values())).created > self.window:
+                self._groups.popitem(last=False)
+            slot = (transmitter, key)
+            group = self._groups.get(slot)
+            if group is None or group.messages != messages:
+                # First request, or the reply changed (e.g. a new forecast)
+                self._groups.pop(slot, None)
+                group = self._groups[slot] = _SharedReply(messages, now)
+
+            mine = group.requesters.get(destination)
+            if mine is not None:
+                self._repeat(transmitter, group, mine, destination, airtime, now, pointer)
+            elif self.mode == 'broadcast':
+                self._share_broadcast(transmitter, group, destination, airtime)
+            else:
+                self._share_batch(transmitter, group, destination)
+
+    def _repeat(self, transmitter, group, mine, destination, airtime, now, pointer):
+        delivery = mine or group.broadcast
+        if _pending(delivery):
+            # Their copy is still on its way
+            metrics.incr('fanout_duplicates')
+            metrics.incr('fanout_airtime_saved_seconds', airtime)
+            return
+        sent_at = _last_sent(delivery)
+        text = pointer(int(now - sent_at) if sent_at else 0, not mine)
+        transmitter.enqueue(text, destination=destination, priority=PRIORITY_REPLY)
+        metrics.incr('fanout_pointers')
+        metrics.incr('fanout_airtime_saved_seconds', max(0.0, airtime - transmitter.estimate_airtime(text)))
+
+    def _share_broadcast(self, transmitter, group, destination, airtime):
+        if group.broadcast and _pending(group.broadcast):
+            group.requesters[destination] = []
+            metrics.incr('fanout_shared')
+            metrics.incr('fanout_airtime_saved_seconds', airtime)
+            return
+        waiting = [d for d, queued in group.requesters.items() if queued and _pending(queued)]
+        if len(waiting) + 1 < self.min_requesters:
+            group.requesters[destination] = transmitter.enqueue(group.messages, destination=destination,
+                                                                priority=PRIORITY_REPLY)
+            return
+        withdrawn = 0
+        for waiting_destination in waiting:
+            # A reply already partly sent is left to finish
+            if transmitter.cancel(group.requesters[waiting_destination]):
+                group.requesters[waiting_destination] = []
+                withdrawn += 1
+        # Shared like a batch reply; alerts, a lane of their own, still go first
+        group.broadcast = transmitter.enqueue(group.messages, priority=PRIORITY_FANOUT)
+        group.requesters[destination] = []
+        metrics.incr('fanout_broadcasts')
+        metrics.incr('fanout_shared', withdrawn + 1)
+        metrics.incr('fanout_airtime_saved_seconds', airtime * withdrawn)
+
+    def _share_batch(self, transmitter, group, destination):
+        if len(group.requesters) + 1 < self.min_requesters:
+            group.requesters[destination] = transmitter.enqueue(group.messages, destination=destination,
+                                                                priority=PRIORITY_REPLY)
+            return
+        for waiting_destination, queued in group.requesters.items():
+            if queued and queued[0].priority != PRIORITY_FANOUT and _pending(queued) and transmitter.cancel(queued):
+                group.requesters[waiting_destination] = transmitter.enqueue(
+                    group.messages, destination=waiting_destination, priority=PRIORITY_FANOUT)
+        group.requesters[destination] = transmitter.enqueue(group.messages, destination=destination,
+                                                            priority=PRIORITY_FANOUT)
+        metrics.incr('fanout_shared')
@@ -0,0 +1,171 @@
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+def next_daily(hour, minute=0):
+    """Returns a next_run callable for a job that runs every day at hour:minute local time."""
+    def _next(now):
+        current = datetime.fromtimestamp(now)
+        target = current.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if target <= current:
+            target += timedelta(days=1)
+        return target.timestamp()
+    return _next
+
+
+def next_hourly(offset):
+    """Returns a next_run callable for a job that runs `offset` seconds past every hour."""
+    def _next(now):
+        slot = now - (now % 3600) + offset
+        return slot if slot > now else slot + 3600
+    return _next
+
+
+class Job:
+    """A periodic job in the Scheduler."""
+    __slots__ = ('name', 'func', 'interval', 'next_run_func', 'jitter', 'retry', 'catch_up', 'grace',
+                 'due', 'cancelled')
+
+    def __init__(self, name, func, interval, next_run_func, jitter, retry, catch_up, grace):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.next_run_func = next_run_func
+        self.jitter = jitter
+        self.retry = retry
+        self.catch_up = catch_up
+        self.grace = grace
+        self.due = 0.0
+        self.cancelled = False
+
+    def schedule_after(self, now):
+        """Computes the job's next due time after `now`, with jitter."""
+        if self.next_run_func:
+            due = self.next_run_func(now)
+        else:
+            due = now + self.interval
+        self.due = due + (random.uniform(0, self.jitter) if self.jitter else 0)
+
+
+class Scheduler:
+    """
+    Timer-heap scheduler for the bot's periodic work. The run loop sleeps until
+    the next job is due instead of waking every second.
+
+    Jobs run one at a time on the scheduler thread, so they should hand slow
+    work to other threads or finish quickly. A job that returns False is retried
+    after its `retry` delay (if set). When the loop wakes more than `grace`
+    seconds after a job was due (e.g. the host was suspended), a catch_up job
+    runs once straight away; other jobs skip the missed run.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._jobs = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._running = False
+        self._stopped = False  # Set by stop(); never cleared, so an early stop is not lost
+
+    def add_job(self, name, func, interval=None, next_run=None, jitter=0, retry=None,
+                run_now=False, catch_up=True, grace=60):
+        """
+        Registers a job. Give either a fixed `interval` in seconds or a `next_run`
+        callable mapping the current epoch time to the next due time.
+        Replaces any existing job with the same name.
+        """
+        if interval is None and next_run is None:
+            raise ValueError("A job needs an interval or a next_run function.")
+        job = Job(name, func, interval, next_run, jitter, retry, catch_up, grace)
+        now = time.time()
+        if run_now:
+            job.due = now
+        else:
+            job.schedule_after(now)
+        with self._cond:
+            old = self._jobs.get(name)
+            if old:
+                old.cancelled = True
+            self._jobs[name] = job
+            heapq.heappush(self._heap, (job.due, next(self._seq), job))
+            self._cond.notify()
+        return job
+
+    def remove_job(self, name):
+        with self._cond:
+            job = self._jobs.pop(name, None)
+            if job:
+                job.cancelled = True
+                self._cond.notify()
+
+    def run_soon(self, name, delay=0):
+        """Makes a registered job due immediately (or in `delay` seconds)."""
+        with self._cond:
+            job = self._jobs.get(name)
+            if job:
+                job.cancelled = True
+                job = self._jobs[name] = self._clone(job)
+                job.due = time.time() + max(0, delay)
+                heapq.heappush(self._heap, (job.due, next(self._seq), job))
+                self._cond.notify()
+
+    def run(self):
+        """Runs due jobs until stop() is called. Blocks the calling thread."""
+        with self._cond:
+            if self._stopped:
+                return
+            self._running = True
+        while True:
+            with self._cond:
+                while self._running:
+                    while self._heap and self._heap[0][2].cancelled:
+                        heapq.heappop(self._heap)
+                    if self._heap and self._heap[0][0] <= time.time():
+                        break
+                    timeout = self._heap[0][0] - time.time() if self._heap else None
+                    self._cond.wait(timeout)
+                if not self._running:
+                    return
+                _, _, job = heapq.heappop(self._heap)
+
+            now = time.time()
+            late = now - job.due
+            if late > job.grace and not job.catch_up:
+                logging.info(f"Skipping missed run of '{job.name}' ({int(late)}s late).")
+                result = None
+            else:
+                try:
+                    result = job.func()
+                except Exception as e:
+                    logging.error(f"Scheduled job '{job.name}' failed: {e}", exc_info=True)
+                    result = False
+
+            with self._cond:
+                if job.cancelled:
+                    continue
+                now = time.time()
+                if result is False and job.retry:
+                    job.due = now + job.retry
+                else:
+                    job.schedule_after(now)
+                heapq.heappush(self._heap, (job.due, next(self._seq), job))
+
+    def stop(self):
+        """
+        Stops the run loop after the job currently running (if any) returns.
+        A stop before run() is called makes run() return straight away.
+        """
+        with self._cond:
+            self._stopped = True
+            self._running = False
+            self._cond.notify_all()
+
+    @staticmethod
+    def _clone(job):
+        return Job(job.name, job.func, job.interval, job.next_run_func, job.jitter, job.retry,
+                   job.catch_up, job.grace)
@@ -0,0 +1,209 @@
+import logging
+import os
+import re
+
+import yaml
+
+NUMBER = (int, float)
+
+
+def _at_least(minimum):
+    def _check(value):
+        return None if value >= minimum else f"must be at least {minimum}"
+    return _check
+
+
+def _between(low, high):
+    def _check(value):
+        return None if low <= value <= high else f"must be between {low} and {high}"
+    return _check
+
+
+def _matches(pattern, description):
+    regex = re.compile(pattern)
+
+    def _check(value):
+        return None if regex.match(value) else f"must be {description}"
+    return _check
+
+
+def _one_of(*choices):
+    def _check(value):
+        return None if value.lower() in choices else f"must be one of {', '.join(repr(c) for c in choices)}"
+    return _check
+
+
+# key -> (accepted types, extra check or None, None allowed)
+SETTINGS_SCHEMA = {
+    'ECCC_LOCATION_CODE': (str, _matches(r'^[sS]\d{7}$', "an ECCC site code like 's0000458'"), False),
+    'ALERT_PROVINCE_CODE': (str, _matches(r'^[A-Za-z]{2}$', "a two-letter province code"), False),
+    'SITE_LIST_PATH': (str, None, True),
+    'NODE_LOCATIONS': (dict, None, True),
+    'MYNODES': (list, None, True),
+    'ADMIN_NODES': (list, None, True),
+    'DM_MODE': (bool, None, False),
+    'FIREWALL': (bool, None, False),
+
+    'ALERT_LOCATIONS': (list, None, True),
+    'ALERT_REGIONS': (list, None, True),
+    'ALERT_CHECK_INTERVAL': (NUMBER, _at_least(10), False),
+    'ALERT_STORE_PATH': (str, None, True),
+    'ALERT_COMPACT': (bool, None, False),
+    'ALERT_INCLUDE_DESCRIPTION': (bool, None, False),
+
+    'USER_AGENT_APP': (str, None, False),
+    'USER_AGENT_EMAIL': (str, None, False),
+    'FETCH_WORKERS': (int, _at_least(1), False),
+    'FORECAST_CACHE_MAX_BYTES': (int, _at_least(1), False),
+    'PRERENDER_REPLIES': (bool, None, False),
+    'OBSERVATION_HISTORY_SIZE': (int, _at_least(2), False),
+    'BACKGROUND_REFRESH': (bool, None, False),
+    'FORECAST_REFRESH_OFFSET': (NUMBER, _between(0, 3599), False),
+    'REFRESH_JITTER': (NUMBER, _at_least(0), False),
+    'SNAPSHOT_PATH': (str, None, True),
+    'SNAPSHOT_INTERVAL': (NUMBER, _at_least(1), False),
+    'SHARED_CACHE_PATH': (str, None, True),
+
+    'NOTIFY_SOURCE': (str, _one_of('', 'amqp', 'file', 'udp'), True),
+    'NOTIFY_AMQP_URL': (str, None, True),
+    'NOTIFY_AMQP_EXCHANGE': (str, None, True),
+    'NOTIFY_AMQP_TOPICS': (list, None, True),
+    'NOTIFY_FILE': (str, None, False),
+    'NOTIFY_UDP_PORT': (int, _between(1, 65535), False),
+    'NOTIFY_FALLBACK_INTERVAL': (NUMBER, _at_least(10), False),
+    'NOTIFY_ALERT_DEBOUNCE': (NUMBER, _at_least(0), False),
+
+    'COMMAND_WORKERS': (int, _at_least(1), False),
+    'INBOUND_QUEUE_SIZE': (int, _at_least(1), False),
+    'RATE_LIMIT_PER_MINUTE': (NUMBER, _at_least(0), False),
+    'RATE_LIMIT_BURST': (NUMBER, _at_least(1), False),
+    'REPLY_FANOUT': (str, _one_of('', 'broadcast', 'batch'), True),
+    'REPLY_FANOUT_WINDOW': (NUMBER, _at_least(1), False),
+    'REPLY_FANOUT_MIN': (int, _at_least(2), False),
+
+    'MESSAGE_DELAY': (NUMBER, _at_least(0), False),
+    'MAX_PAYLOAD_BYTES': (int, _between(16, 237), False),
+    'PART_MARKERS': (bool, None, False),
+    'TX_DUTY_CYCLE_PERCENT': (NUMBER, _between(0, 100), False),
+    'TX_DUTY_CYCLE_WINDOW': (NUMBER, _at_least(1), False),
+    'TX_AIRTIME_MS_PER_BYTE': (NUMBER, _at_least(0), False),
+    'TX_AIRTIME_OVERHEAD_MS': (NUMBER, _at_least(0), False),
+
+    'ENABLE_5DAY_FORECAST': (bool, None, False),
+    'ENABLE_7DAY_FORECAST': (bool, None, False),
+    'ENABLE_HOURLY_WEATHER': (bool, None, False),
+    'FULL_MENU': (bool, None, False),
+
+    'ENABLE_AUTO_REBOOT': (bool, None, False),
+    'AUTO_REBOOT_HOUR': (int, _between(0, 23), False),
+    'AUTO_REBOOT_MINUTE': (int, _between(0, 59), False),
+    'REBOOT_DELAY_SECONDS': (NUMBER, _at_least(0), False),
+
+    'STATS_INTERVAL': (NUMBER, _at_least(1), False),
+    'METRICS_FILE': (str, None, True),
+    'METRICS_INTERVAL': (NUMBER, _at_least(1), False),
+    'METRICS_PORT': (int, _between(0, 65535), True),
+    'SETTINGS_RELOAD_INTERVAL': (NUMBER, _at_least(0), False),
+}
+
+REQUIRED_SETTINGS = ('ECCC_LOCATION_CODE', 'ALERT_PROVINCE_CODE')
+
+# Settings read once at startup (ports, files, thread pools); a reload that
+# changes them is applied everywhere else and logged as needing a restart.
+RESTART_SETTINGS = (
+    'SITE_LIST_PATH', 'OBSERVATION_HISTORY_SIZE', 'ALERT_STORE_PATH', 'SNAPSHOT_PATH', 'SHARED_CACHE_PATH', 'FETCH_WORKERS',
+    'COMMAND_WORKERS', 'INBOUND_QUEUE_SIZE', 'METRICS_PORT', 'NOTIFY_SOURCE', 'NOTIFY_AMQP_URL',
+    'NOTIFY_AMQP_EXCHANGE', 'NOTIFY_AMQP_TOPICS', 'NOTIFY_FILE', 'NOTIFY_UDP_PORT',
+)
+
+
+class SettingsError(ValueError):
+    """A settings file that could not be read or failed validation."""
+
+    def __init__(self, problems):
+        self.problems = list(problems)
+        super().__init__("; ".join(self.problems))
+
+
+def validate_settings(settings):
+    """
+    Checks settings against SETTINGS_SCHEMA and raises SettingsError listing
+    every problem found. Unknown keys are only logged, since they may belong
+    to a newer or older version of the bot.
+    """
+    if not isinstance(settings, dict):
+        raise SettingsError(["the settings file must contain a mapping of KEY: value"])
+
+    problems = [f"{key} is required" for key in REQUIRED_SETTINGS if not settings.get(key)]
+    for key, value in settings.items():
+        rule = SETTINGS_SCHEMA.get(key)
+        if rule is None:
+            logging.warning(f"Unknown setting '{key}' ignored.")
+            continue
+        types, check, nullable = rule
+        if value is None:
+            if not nullable and key not in REQUIRED_SETTINGS:
+                problems.append(f"{key} must have a value")
+            continue
+        # bool is an int subclass, but 'true' is never a valid number here
+        if not isinstance(value, types) or (isinstance(value, bool) and types is not bool):
+            names = types.__name__ if isinstance(types, type) else " or ".join(t.__name__ for t in types)
+            problems.append(f"{key} must be {names}, not {type(value).__name__}")
+            continue
+        error = check(value) if check else None
+        if error:
+            problems.append(f"{key} {error}")
+
+    if problems:
+        raise SettingsError(problems)
+    return settings
+
+
+def read_settings(path):
+    """Reads a YAML settings file without validating it. Raises SettingsError if it cannot be read."""
+    try:
+        with open(path, 'r') as f:
+            return yaml.safe_load(f)
+    except FileNotFoundError:
+        raise SettingsError([f"settings file not found at '{path}'"])
+    except (OSError, yaml.YAMLError) as e:
+        raise SettingsError([f"could not read settings file: {e}"])
+
+
+def load_settings(path):
+    """Reads and validates a YAML settings file. Raises SettingsError on any problem."""
+    return validate_settings(read_settings(path))
+
+
+def changed_settings(old, new):
+    """Returns the set of keys whose values differ between two settings dicts."""
+    return {key for key in old.keys() | new.keys() if old.get(key) != new.get(key)}
+
+
+class SettingsFile:
+    """
+    Tracks a settings file's modification time so it can be polled cheaply
+    and reloaded only when it has been saved again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._stamp = self._read_stamp()
+
+    def _read_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def changed(self):
+        """True (once) if the file was modified since the last check."""
+        stamp = self._read_stamp()
+        if stamp is None or stamp == self._stamp:
+            return False
+        self._stamp = stamp
+        return True
+
+    def read(self):
+        return read_settings(self.path)
@@ -0,0 +1,100 @@
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+
+class SharedEntry:
+    """A payload stored in the SharedCache by any bot process on the host."""
+    __slots__ = ('payload', 'etag', 'last_modified', 'changed_at', 'checked_at')
+
+    def __init__(self, payload, etag, last_modified, changed_at, checked_at):
+        self.payload = payload
+        self.etag = etag
+        self.last_modified = last_modified
+        self.changed_at = changed_at
+        self.checked_at = checked_at
+
+
+class SharedCache:
+    """
+    Cross-process cache for bot instances running on the same host.
+    A SQLite database in WAL mode (which does the file locking) holds the
+    latest payload per URL, its HTTP validators, when it last changed and when
+    it was last checked upstream. Short fetch leases make sure only one process
+    downloads a given URL at a time; the others read its result.
+    """
+    LEASE_SECONDS = 30
+
+    def __init__(self, path):
+        self.path = path
+        self.owner = f"{os.getpid()}-{id(self)}"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS payloads ("
+            " key TEXT PRIMARY KEY,"
+            " payload BLOB NOT NULL,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " changed_at REAL NOT NULL,"
+            " checked_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)"
+        )
+
+    def get(self, key):
+        """Returns the SharedEntry for key, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, etag, last_modified, changed_at, checked_at FROM payloads WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return SharedEntry(zlib.decompress(row[0]), row[1], row[2], row[3], row[4])
+
+    def put(self, key, payload, etag=None, last_modified=None):
+        """
+        Stores a new payload for key (compressed), marking it changed and checked now.
+        Returns the changed_at time recorded.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO payloads (key, payload, etag, last_modified, changed_at, checked_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, zlib.compress(payload), etag, last_modified, now, now),
+            )
+        return now
+
+    def touch(self, key):
+        """Records that key was checked upstream and had not changed (e.g. a 304)."""
+        with self._lock:
+            self._conn.execute("UPDATE payloads SET checked_at = ? WHERE key = ?", (time.time(), key))
+
+    def acquire_lease(self, key, ttl=LEASE_SECONDS):
+        """Takes the fetch lease for key if it is free or expired. Returns True on success."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT owner, expires FROM leases WHERE key = ?", (key,)).fetchone()
+                if row and row[0] != self.owner and row[1] > now:
+                    return False
+                self._conn.execute("INSERT OR REPLACE INTO leases (key, owner, expires) VALUES (?, ?, ?)",
+                                   (key, self.owner, now + ttl))
+                return True
+            finally:
+                self._conn.execute("COMMIT")
+
+    def release_lease(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, self.owner))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,51 @@
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key: while a call is in flight,
+    other callers for that key share its Future instead of starting their own.
+    """
+
+    def __init__(self):
+        # Re-entrant: a Future that is already done runs _forget immediately
+        # from add_done_callback while submit still holds the lock.
+        self._lock = threading.RLock()
+        self._calls = {}  # key -> Future
+
+    def submit(self, key, fn, *args, executor=None):
+        """
+        Returns the in-flight Future for key, or starts fn(*args) and returns its Future.
+        With an executor the call runs there; otherwise it runs in the calling
+        thread before this method returns.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future
+            if executor is not None:
+                future = executor.submit(fn, *args)
+                run_inline = False
+            else:
+                future = Future()
+                future.set_running_or_notify_cancel()
+                run_inline = True
+            self._calls[key] = future
+            future.add_done_callback(lambda f: self._forget(key, f))
+
+        if run_inline:
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
+        return future
+
+    def do(self, key, fn, *args):
+        """Runs fn(*args) once for all concurrent callers of key and returns its result."""
+        return self.submit(key, fn, *args).result()
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
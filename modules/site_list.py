@@ -0,0 +1,139 @@
+import csv
+import io
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+
+SITE_CODE_PATTERN = re.compile(r'^s\d{7}$')
+
+
+def normalize_name(name):
+    """Lower-cases a place name and strips accents and punctuation for lookups."""
+    name = unicodedata.normalize('NFKD', name)
+    name = ''.join(ch for ch in name if not unicodedata.combining(ch))
+    return re.sub(r'[^a-z0-9]+', ' ', name.lower()).strip()
+
+
+class Site:
+    """One ECCC citypage forecast site."""
+    __slots__ = ('code', 'name', 'province', 'lat', 'lon')
+
+    def __init__(self, code, name, province, lat=None, lon=None):
+        self.code = code
+        self.name = name
+        self.province = province
+        self.lat = lat
+        self.lon = lon
+
+    def __repr__(self):
+        return f"Site({self.code!r}, {self.name!r}, {self.province!r})"
+
+
+def _parse_coordinate(value):
+    """Parses ECCC coordinates such as '43.74N' or '79.37W' into signed degrees."""
+    if not value:
+        return None
+    value = value.strip().upper()
+    sign = -1 if value[-1:] in ('S', 'W') else 1
+    try:
+        return sign * float(value.rstrip('NSEW'))
+    except ValueError:
+        return None
+
+
+class SiteList:
+    """
+    Lookup index from place names to ECCC site codes, built from the ECCC
+    citypage site list. The list is downloaded once, cached on disk and loaded
+    into memory on first use. If it cannot be obtained (no network yet at boot),
+    lookups fail until a later one retries, at most every RETRY_DELAY seconds.
+    """
+    SITE_LIST_URL = "https://dd.weather.gc.ca/citypage_weather/docs/site_list_en.csv"
+    MAX_FILE_AGE = 30 * 86400
+    RETRY_DELAY = 60
+
+    def __init__(self, path, fetch):
+        self.path = path
+        self._fetch = fetch  # Callable(url) -> bytes or None
+        self._by_code = None
+        self._by_name = None
+        self._retry_at = 0
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._by_code is not None
+
+    def resolve(self, query):
+        """Returns the Site for a site code or place name, or None."""
+        if not self._ensure_loaded():
+            return None
+        query = query.strip()
+        if SITE_CODE_PATTERN.match(query.lower()):
+            return self._by_code.get(query.lower())
+        return self._by_name.get(normalize_name(query))
+
+    def __len__(self):
+        return len(self._by_code) if self._ensure_loaded() else 0
+
+    def _ensure_loaded(self):
+        """Loads the index if needed. Returns False if it is still unavailable."""
+        if self._by_code is not None:
+            return True
+        with self._lock:
+            if self._by_code is None and time.time() >= self._retry_at:
+                self._load()
+        return self._by_code is not None
+
+    def _load(self):
+        data = None
+        if self.path and os.path.exists(self.path):
+            if time.time() - os.path.getmtime(self.path) < self.MAX_FILE_AGE:
+                with open(self.path, 'rb') as f:
+                    data = f.read()
+
+        if data is None:
+            fetched = self._fetch(self.SITE_LIST_URL)
+            if fetched:
+                data = fetched
+                if self.path:
+                    try:
+                        tmp_path = f"{self.path}.tmp"
+                        with open(tmp_path, 'wb') as f:
+                            f.write(data)
+                        os.replace(tmp_path, self.path)
+                    except OSError as e:
+                        logging.warning(f"Could not cache ECCC site list at {self.path}: {e}")
+            elif self.path and os.path.exists(self.path):
+                # An old copy is better than none.
+                with open(self.path, 'rb') as f:
+                    data = f.read()
+
+        if not data:
+            self._retry_at = time.time() + self.RETRY_DELAY
+            logging.warning(f"ECCC site list unavailable; place names will not resolve until it loads "
+                            f"(retrying in {self.RETRY_DELAY}s).")
+            return
+        self._by_code, self._by_name = self._parse(data)
+        logging.info(f"Loaded {len(self._by_code)} ECCC forecast sites.")
+
+    @staticmethod
+    def _parse(data):
+        by_code, by_name = {}, {}
+        lines = data.decode('utf-8-sig', errors='replace').splitlines()
+        # The file may start with a title line before the real header.
+        start = next((i for i, line in enumerate(lines) if line.startswith('Codes')), 0)
+        for row in csv.DictReader(io.StringIO("\n".join(lines[start:]))):
+            code = (row.get('Codes') or '').strip().lower()
+            name = (row.get('English Names') or '').strip()
+            province = (row.get('Province Codes') or '').strip().upper()
+            if not code or not name or not province:
+                continue
+            site = Site(code, name, province,
+                        _parse_coordinate(row.get('Latitude')), _parse_coordinate(row.get('Longitude')))
+            by_code[code] = site
+            by_name.setdefault(normalize_name(name), site)
+        return by_code, by_name
@@ -0,0 +1,52 @@
+import gzip
+import json
+import logging
+import os
+import re
+
+SNAPSHOT_VERSION = 1
+
+
+def instance_path(path, instance):
+    """
+    Gives a bot instance its own copy of a state file, e.g.
+    'weatherbot_snapshot.json.gz' for '/dev/ttyUSB0' becomes
+    'weatherbot_snapshot-dev_ttyUSB0.json.gz'. Unchanged without an instance.
+    """
+    if not path or not instance:
+        return path
+    directory, name = os.path.split(path)
+    stem, dot, extension = name.partition('.')
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', instance).strip('_')
+    return os.path.join(directory, f"{stem}-{slug}{dot}{extension}")
+
+
+def write_snapshot(path, state):
+    """
+    Atomically writes state as gzip-compressed JSON: the data goes to a
+    temporary file that then replaces the old snapshot, so a crash mid-write
+    never leaves a torn file behind.
+    """
+    payload = json.dumps({'version': SNAPSHOT_VERSION, 'state': state},
+                         separators=(',', ':')).encode('utf-8')
+    tmp_path = f"{path}.tmp"
+    with gzip.open(tmp_path, 'wb', compresslevel=6) as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+    return len(payload)
+
+
+def read_snapshot(path):
+    """Returns the saved state, or None if the snapshot is missing, unreadable or from another version."""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with gzip.open(path, 'rb') as f:
+            data = json.loads(f.read().decode('utf-8'))
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable snapshot {path}: {e}")
+        return None
+    if not isinstance(data, dict) or data.get('version') != SNAPSHOT_VERSION:
+        logging.info(f"Ignoring snapshot {path} from an older version.")
+        return None
+    return data.get('state')
@@ -0,0 +1,220 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from modules.metrics import metrics
+
+# Lower numbers are sent first.
+PRIORITY_ALERT = 0
+PRIORITY_FANOUT = 5  # Replies shared by several requesters
+PRIORITY_REPLY = 10
+PRIORITY_BACKGROUND = 20
+
+
+class _OutboundMessage:
+    """A single packet waiting in the outbound queue."""
+    __slots__ = ('text', 'destination', 'priority', 'seq', 'enqueued_at', 'sent_at', 'cancelled')
+
+    def __init__(self, text, destination, priority, seq):
+        self.text = text
+        self.destination = destination
+        self.priority = priority
+        self.seq = seq
+        self.enqueued_at = time.monotonic()
+        self.sent_at = None  # Monotonic time it was handed to the radio
+        self.cancelled = False
+
+
+class TransmitScheduler:
+    """
+    Owns the outbound side of the radio.
+    Callers enqueue messages and return immediately; a single worker thread
+    paces them onto the mesh, honouring MESSAGE_DELAY between packets and a
+    rolling airtime (duty-cycle) budget. Messages of the same priority to the
+    same destination are always sent in the order they were queued, while
+    higher-priority traffic (e.g. alert broadcasts) jumps ahead of lower-priority
+    messages, including earlier ones to the same destination.
+    """
+
+    def __init__(self, settings, send_func):
+        self.send_func = send_func
+        self._cond = threading.Condition()
+        self.apply_settings(settings)
+        self._seq = itertools.count()
+        # Heap holds only the head message of each lane's queue, which keeps
+        # per-lane ordering while still sorting by priority. A lane is one
+        # destination at one priority, so an alert broadcast never waits behind
+        # a reply-priority broadcast that is itself behind other replies.
+        self._heap = []
+        self._pending = {}  # (destination, priority) -> deque of _OutboundMessage
+        self._airtime_log = deque()  # (monotonic timestamp, seconds)
+        self._airtime_used = 0.0
+        self._last_send = 0.0
+        self._running = False
+        self._worker = None
+
+    def apply_settings(self, settings):
+        """Updates pacing and airtime limits; a waiting worker re-checks its delay straight away."""
+        with self._cond:
+            self.message_delay = settings.get('MESSAGE_DELAY', 5)
+            self.duty_cycle = settings.get('TX_DUTY_CYCLE_PERCENT', 10) / 100.0
+            self.duty_window = settings.get('TX_DUTY_CYCLE_WINDOW', 3600)
+            self.ms_per_byte = settings.get('TX_AIRTIME_MS_PER_BYTE', 8)
+            self.overhead_ms = settings.get('TX_AIRTIME_OVERHEAD_MS', 300)
+            self._cond.notify()
+
+    def start(self):
+        """Starts the transmit worker thread."""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._worker = threading.Thread(target=self._run, name="transmit-scheduler", daemon=True)
+        self._worker.start()
+
+    def stop(self, timeout=5):
+        """Stops the worker. Messages still in the queue are dropped."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._worker:
+            self._worker.join(timeout)
+            self._worker = None
+
+    def enqueue(self, messages, destination=None, priority=PRIORITY_REPLY):
+        """
+        Queues one or more packets for transmission.
+        A destination of None broadcasts on the primary channel.
+        Returns the queued packets, which can be passed to cancel().
+        """
+        if isinstance(messages, str):
+            messages = [messages]
+        queued = []
+        lane = (destination, priority)
+        with self._cond:
+            queue = self._pending.get(lane)
+            is_new_head = not queue
+            if queue is None:
+                queue = self._pending[lane] = deque()
+            for text in messages:
+                if text:
+                    queued.append(_OutboundMessage(text, destination, priority, next(self._seq)))
+            queue.extend(queued)
+            if not queue:
+                del self._pending[lane]
+                return queued
+            if is_new_head:
+                self._push_head(queue[0])
+            self._cond.notify()
+        return queued
+
+    def cancel(self, queued):
+        """
+        Withdraws packets returned by enqueue(), all or nothing: returns False
+        (and changes nothing) if any of them was already sent, so a multi-part
+        reply is never cut short.
+        """
+        with self._cond:
+            if any(message.sent_at is not None for message in queued):
+                return False
+            for message in queued:
+                message.cancelled = True
+            for lane in {(message.destination, message.priority) for message in queued}:
+                queue = self._pending.get(lane)
+                if not queue:
+                    continue
+                head = queue[0]
+                remaining = deque(message for message in queue if not message.cancelled)
+                if not remaining:
+                    del self._pending[lane]
+                    continue
+                self._pending[lane] = remaining
+                # The old head's heap entry is skipped by the worker once it surfaces
+                if remaining[0] is not head:
+                    self._push_head(remaining[0])
+            self._cond.notify()
+        return True
+
+    def queue_depth(self):
+        """Returns the number of packets waiting to be sent."""
+        with self._cond:
+            return sum(len(q) for q in self._pending.values())
+
+    def estimate_airtime(self, text):
+        """Rough on-air time in seconds for a text packet."""
+        return (self.overhead_ms + self.ms_per_byte * len(text.encode('utf-8'))) / 1000.0
+
+    def _push_head(self, message):
+        heapq.heappush(self._heap, (message.priority, message.seq, message))
+
+    def _budget_wait(self, airtime, now):
+        """Seconds until the duty-cycle budget can absorb another packet."""
+        if self.duty_cycle <= 0:
+            return 0
+        while self._airtime_log and self._airtime_log[0][0] <= now - self.duty_window:
+            _, spent = self._airtime_log.popleft()
+            self._airtime_used -= spent
+
+        budget = self.duty_cycle * self.duty_window
+        excess = self._airtime_used + airtime - budget
+        if excess <= 0:
+            return 0
+        freed = 0.0
+        for stamp, spent in self._airtime_log:
+            freed += spent
+            if freed >= excess:
+                return stamp + self.duty_window - now
+        # A single packet larger than the whole budget; wait a full window.
+        return self.duty_window
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and not self._heap:
+                    self._cond.wait()
+                if not self._running:
+                    return
+
+                message = self._heap[0][2]
+                if message.cancelled:
+                    # Withdrawn by cancel(), which already removed it from its queue
+                    heapq.heappop(self._heap)
+                    continue
+                now = time.monotonic()
+                airtime = self.estimate_airtime(message.text)
+                delay = max(self._last_send + self.message_delay - now,
+                            self._budget_wait(airtime, now))
+                if delay > 0:
+                    # Woken early if something new (possibly higher priority) arrives.
+                    self._cond.wait(delay)
+                    continue
+
+                heapq.heappop(self._heap)
+                lane = (message.destination, message.priority)
+                queue = self._pending[lane]
+                queue.popleft()
+                if queue:
+                    self._push_head(queue[0])
+                else:
+                    del self._pending[lane]
+                # Committed to the radio from here on; cancel() no longer applies
+                message.sent_at = time.monotonic()
+
+            metrics.observe('outbound_wait', time.monotonic() - message.enqueued_at)
+            try:
+                with metrics.span('radio_send'):
+                    self.send_func(message.text, message.destination)
+            except Exception as e:
+                logging.error(f"Failed to transmit message: {e}")
+                metrics.incr('packets_failed')
+            else:
+                metrics.incr('packets_sent')
+                metrics.incr('airtime_seconds', airtime)
+
+            with self._cond:
+                sent_at = time.monotonic()
+                self._last_send = sent_at
+                self._airtime_log.append((sent_at, airtime))
+                self._airtime_used += airtime
@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TESTS_DIR)
+# Tests import the bot's modules and reuse the benchmark stand-in and fixtures.
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, 'benchmarks'))
+
+from stand_in import ECCCStandIn  # noqa: E402
+
+
+@pytest.fixture
+def stand_in():
+    """The benchmark's local ECCC stand-in, serving the recorded fixtures."""
+    server = ECCCStandIn().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def settings(tmp_path):
+    """Minimal hermetic settings: no state files, no pacing."""
+    return {
+        'ECCC_LOCATION_CODE': 's0000458', 'ALERT_PROVINCE_CODE': 'ON',
+        'SITE_LIST_PATH': str(tmp_path / 'site_list_en.csv'),
+        'ALERT_STORE_PATH': None, 'SNAPSHOT_PATH': "", 'SHARED_CACHE_PATH': "",
+        'MESSAGE_DELAY': 0, 'TX_DUTY_CYCLE_PERCENT': 0, 'BACKGROUND_REFRESH': False,
+    }
+
+
+@pytest.fixture
+def service(stand_in, settings):
+    """An ECCCWeatherService pointed at the stand-in."""
+    from modules.eccc_weather_service import ECCCWeatherService
+    weather_service = ECCCWeatherService(settings)
+    stand_in.configure(weather_service)
+    yield weather_service
+    weather_service.close()
@@ -0,0 +1,34 @@
+from modules.eccc_weather_service import ECCCWeatherService
+
+
+def make_service(stand_in, settings, **overrides):
+    service = ECCCWeatherService(dict(settings, **overrides))
+    stand_in.configure(service)
+    return service
+
+
+def test_place_names_match_nothing_until_the_site_list_loads(stand_in, settings):
+    service = make_service(stand_in, settings, ALERT_LOCATIONS=['Toronto'])
+    try:
+        fetch = service.site_list._fetch
+        service.site_list._fetch = lambda url: None  # Network not up yet
+
+        # Never the province-wide fallback while the name cannot be looked up
+        assert service.get_alerts() == []
+        assert service.get_new_alerts() == []
+
+        service.site_list._fetch = fetch
+        service.site_list._retry_at = 0
+        service.refresh_alerts()
+        alerts = service.get_alerts()
+        assert [alert['locations'] for alert in alerts] == [['Toronto']]
+    finally:
+        service.close()
+
+
+def test_points_outside_every_polygon_match_nothing(stand_in, settings):
+    service = make_service(stand_in, settings, ALERT_LOCATIONS=['45.42,-75.70'])  # Ottawa
+    try:
+        assert service.get_alerts() == []
+    finally:
+        service.close()
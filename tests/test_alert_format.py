@@ -0,0 +1,27 @@
+from fixtures import storm_feed
+from modules.eccc_weather_service import ECCCWeatherService
+from modules.meshtastic_formatter import MeshtasticFormatter
+
+
+def alert_lines(stand_in, settings):
+    service = ECCCWeatherService(settings)
+    stand_in.configure(service)
+    try:
+        alerts = service.get_alerts()
+    finally:
+        service.close()
+    return MeshtasticFormatter(settings).format_alert_batch(alerts).splitlines()[:-1]
+
+
+def test_recorded_alert_is_labelled_by_name_not_bare_event(stand_in, settings):
+    # The recorded CAP event is just "rainfall"; the broadcast must say it is a warning
+    lines = alert_lines(stand_in, dict(settings, ALERT_LOCATIONS=['Toronto']))
+    assert len(lines) == 1
+    assert lines[0].startswith("!! RAIN WRN: ")
+
+
+def test_watches_and_warnings_are_not_merged(stand_in, settings):
+    stand_in.alert_feed = storm_feed(count=600, updates=0)
+    labels = {line.split(':', 1)[0] for line in alert_lines(stand_in, settings)}
+    assert "!! SVR TSTM WCH" in labels
+    assert "!! SVR TSTM WRN" in labels
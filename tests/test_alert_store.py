@@ -0,0 +1,38 @@
+import sqlite3
+
+from modules.alert_store import AlertStore
+
+
+def test_each_channel_broadcasts_an_alert_once(tmp_path):
+    path = str(tmp_path / 'alerts.db')
+    first, first_again, second = AlertStore(path, channel='/dev/ttyUSB0'), \
+        AlertStore(path, channel='/dev/ttyUSB0'), AlertStore(path, channel='/dev/ttyUSB1')
+
+    assert first.claim({'id': 'A'})
+    assert not first_again.claim({'id': 'A'})  # Same radio, another process
+    assert 'A' in first_again
+    assert 'A' not in second
+    assert second.claim({'id': 'A'})  # Other radios still get it
+
+
+def test_superseded_alert_stays_known_after_eviction():
+    store = AlertStore(None)
+    assert store.claim({'id': 'A'})
+    assert store.claim({'id': 'B', 'references': ['A']})
+    assert store.evict() == 1
+    assert 'A' in store and store.any_sent(['A'])
+
+
+def test_old_single_channel_records_are_kept(tmp_path):
+    path = str(tmp_path / 'alerts.db')
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE sent_alerts (identifier TEXT PRIMARY KEY, refs TEXT NOT NULL DEFAULT '',"
+                 " expires REAL, superseded_by TEXT, sent_at REAL NOT NULL)")
+    conn.execute("INSERT INTO sent_alerts VALUES ('A', '', NULL, NULL, strftime('%s', 'now'))")
+    conn.commit()
+    conn.close()
+
+    for channel in ('/dev/ttyUSB0', '/dev/ttyUSB1'):
+        store = AlertStore(path, channel=channel)
+        assert 'A' in store
+        assert not store.claim({'id': 'A'})
@@ -0,0 +1,16 @@
+from modules.reply_fanout import ReplyFanout
+from modules.transmit_scheduler import PRIORITY_ALERT, TransmitScheduler
+from test_transmit_scheduler import UNPACED, drain
+
+
+def test_alert_goes_before_a_fanout_broadcast():
+    transmitter = TransmitScheduler(UNPACED, None)
+    fanout = ReplyFanout({'REPLY_FANOUT': 'broadcast', 'REPLY_FANOUT_MIN': 3})
+    for node in range(3):
+        fanout.send(transmitter, 'wx', ["forecast 1/2", "forecast 2/2"], f"!{node:08x}",
+                    lambda age, broadcast: f"sent {age}s ago")
+    assert transmitter.queue_depth() == 2  # The unicasts were folded into one broadcast
+    transmitter.enqueue("ALERT", priority=PRIORITY_ALERT)
+
+    sent = drain(transmitter, 3)
+    assert sent == [("ALERT", None), ("forecast 1/2", None), ("forecast 2/2", None)]
@@ -0,0 +1,27 @@
+import threading
+
+from modules.scheduler import Scheduler
+
+
+def test_stop_before_run_is_not_lost():
+    scheduler = Scheduler()
+    scheduler.add_job('tick', lambda: None, interval=3600)
+    scheduler.stop()
+
+    runner = threading.Thread(target=scheduler.run, daemon=True)
+    runner.start()
+    runner.join(2)
+    assert not runner.is_alive()
+
+
+def test_stop_ends_a_running_loop():
+    scheduler = Scheduler()
+    ran = threading.Event()
+    scheduler.add_job('tick', ran.set, interval=3600, run_now=True)
+
+    runner = threading.Thread(target=scheduler.run, daemon=True)
+    runner.start()
+    assert ran.wait(2)
+    scheduler.stop()
+    runner.join(2)
+    assert not runner.is_alive()
@@ -0,0 +1,49 @@
+import threading
+from collections import Counter
+
+CALLERS = 20
+
+
+def count_calls(counts, name, fn, key):
+    lock = threading.Lock()
+
+    def wrapper(*args, **kwargs):
+        with lock:
+            counts[(name, key(*args))] += 1
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+def test_concurrent_callers_share_one_fetch_and_parse(stand_in, service):
+    site = service.resolve_location()  # Loads the site list before counting
+    forecast_url, alert_url = service._forecast_url(site), service.ALERT_URL
+    counts = Counter()
+    service._make_request = count_calls(counts, 'fetch', service._make_request, lambda url, *_: url)
+    service._parse_daily_forecast = count_calls(counts, 'parse', service._parse_daily_forecast,
+                                                lambda root: forecast_url)
+    service._ingest_alerts = count_calls(counts, 'parse', service._ingest_alerts, lambda data: alert_url)
+
+    # Latency keeps the first download in flight while the other callers arrive
+    stand_in.latency = 0.2
+    barrier = threading.Barrier(CALLERS)
+    results, errors = [], []
+
+    def caller():
+        try:
+            barrier.wait()
+            results.append((service.get_forecast_entry(), service.get_alerts()))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=caller) for _ in range(CALLERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert len(results) == CALLERS and all(entry is not None for entry, _ in results)
+    assert len({id(entry) for entry, _ in results}) == 1
+    for url in (forecast_url, alert_url):
+        assert counts[('fetch', url)] == 1, url
+        assert counts[('parse', url)] == 1, url
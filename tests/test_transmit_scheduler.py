@@ -0,0 +1,57 @@
+import threading
+
+from modules.transmit_scheduler import PRIORITY_ALERT, PRIORITY_REPLY, TransmitScheduler
+
+UNPACED = {'MESSAGE_DELAY': 0, 'TX_DUTY_CYCLE_PERCENT': 0}
+
+
+def drain(transmitter, expected):
+    """Starts the worker and returns the (text, destination) pairs it sent, in order."""
+    sent = []
+    done = threading.Event()
+
+    def send(text, destination):
+        sent.append((text, destination))
+        if len(sent) == expected:
+            done.set()
+
+    transmitter.send_func = send
+    transmitter.start()
+    try:
+        assert done.wait(5), f"only {len(sent)} of {expected} packets were sent"
+    finally:
+        transmitter.stop()
+    return sent
+
+
+def test_alert_broadcast_jumps_reply_priority_broadcast():
+    transmitter = TransmitScheduler(UNPACED, None)
+    for node in range(3):
+        transmitter.enqueue(f"reply{node}", destination=f"!{node:08x}")
+    transmitter.enqueue("advertise-menu")  # Reply-priority broadcast
+    transmitter.enqueue("ALERT", priority=PRIORITY_ALERT)
+
+    sent = drain(transmitter, 5)
+    assert sent[0] == ("ALERT", None)
+    assert [text for text, _ in sent[1:]] == ["reply0", "reply1", "reply2", "advertise-menu"]
+
+
+def test_parts_to_one_destination_stay_in_order():
+    transmitter = TransmitScheduler(UNPACED, None)
+    transmitter.enqueue(["1/2", "2/2"], destination="!00000001")
+    transmitter.enqueue("other", destination="!00000002")
+    transmitter.enqueue("3", destination="!00000001", priority=PRIORITY_REPLY)
+
+    sent = drain(transmitter, 4)
+    to_first = [text for text, destination in sent if destination == "!00000001"]
+    assert to_first == ["1/2", "2/2", "3"]
+
+
+def test_cancelled_packets_are_not_sent():
+    transmitter = TransmitScheduler(UNPACED, None)
+    queued = transmitter.enqueue(["a", "b"], destination="!00000001")
+    transmitter.enqueue("c", destination="!00000002")
+    assert transmitter.cancel(queued)
+
+    assert drain(transmitter, 1) == [("c", "!00000002")]
+    assert transmitter.queue_depth() == 0